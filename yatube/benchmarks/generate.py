@@ -0,0 +1,206 @@
+import io
+import itertools
+import random
+from bisect import bisect
+from datetime import timedelta
+
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.db.models import Max, Min
+from django.utils import timezone
+from PIL import Image
+from posts.caching import GLOBAL_SCOPE, bump_versions
+from posts.counters import recount
+from posts.models import Comment, Follow, Group, Post, User, UserCounters
+from posts.storage import image_storage
+from posts.timeline import fan_out_range
+from posts.transfer import explicit_pub_date
+
+WORDS = (
+    'кошка собака город лето зима поезд море книга музыка кофе дождь '
+    'солнце друг работа выходные горы река лес утро вечер фильм '
+    'прогулка сад ужин дорога осень весна снег ветер история'
+).split()
+
+
+def zipf_weights(size, alpha):
+    """Накопленные веса степенного распределения 1 / rank ** alpha."""
+    return list(itertools.accumulate(
+        1 / rank ** alpha for rank in range(1, size + 1)
+    ))
+
+
+class PowerLaw:
+    """Выбор id из диапазона с весом 1 / rank ** alpha.
+
+    Ранги перемешаны, чтобы популярные id не шли подряд.
+    """
+
+    def __init__(self, ids, alpha, rng):
+        self.ids = list(ids)
+        rng.shuffle(self.ids)
+        self.weights = zipf_weights(len(self.ids), alpha)
+        self.total = self.weights[-1]
+        self.rng = rng
+
+    def choice(self):
+        position = bisect(self.weights, self.rng.random() * self.total)
+        return self.ids[min(position, len(self.ids) - 1)]
+
+
+class DataGenerator:
+    """Массовая генерация пользователей, подписок, постов и комментариев.
+
+    Строки создаются генераторами и пишутся пачками bulk_create,
+    каждая пачка в своей транзакции, поэтому память не растет с
+    объемом. Сигналы при этом не срабатывают, и счетчики, ленты
+    подписок и кэш страниц обновляются в конце отдельными запросами.
+    """
+
+    def __init__(self, users=1000, groups=20, posts=100000,
+                 comments=200000, follows=30, images=10, alpha=1.2,
+                 days=365, seed=0, batch_size=5000, log=None):
+        self.counts = {
+            'users': users, 'groups': groups, 'posts': posts,
+            'comments': comments, 'follows': follows, 'images': images,
+        }
+        self.alpha = alpha
+        self.days = days
+        self.seed = seed
+        self.batch_size = batch_size
+        self.rng = random.Random(seed)
+        self.log = log or (lambda message: None)
+        self.now = timezone.now()
+        self.prefix = f'bench{seed}_{self.now:%Y%m%d%H%M%S}'
+
+    def _insert(self, model, rows, **kwargs):
+        created = 0
+        rows = iter(rows)
+        while True:
+            batch = list(itertools.islice(rows, self.batch_size))
+            if not batch:
+                return created
+            # Размер одного INSERT Django подбирает под лимиты базы.
+            with transaction.atomic():
+                model.objects.bulk_create(batch, **kwargs)
+            created += len(batch)
+
+    def _random_date(self):
+        return self.now - timedelta(
+            seconds=self.rng.random() * self.days * 24 * 60 * 60
+        )
+
+    def _text(self, low, high):
+        return ' '.join(
+            self.rng.choice(WORDS) for _ in range(self.rng.randint(low, high))
+        ).capitalize()
+
+    def create_users(self):
+        self._insert(User, (
+            User(
+                username=f'{self.prefix}_{i}', password='!',
+                first_name='Бенч', last_name=str(i),
+            )
+            for i in range(self.counts['users'])
+        ))
+        self.user_ids = list(User.objects.filter(
+            username__startswith=f'{self.prefix}_'
+        ).values_list('pk', flat=True))
+        self._insert(
+            UserCounters,
+            (UserCounters(user_id=pk) for pk in self.user_ids),
+            ignore_conflicts=True,
+        )
+        self.popularity = PowerLaw(self.user_ids, self.alpha, self.rng)
+
+    def create_groups(self):
+        self._insert(Group, (
+            Group(
+                title=f'Группа {i}', slug=f'{self.prefix}-{i}'.lower(),
+                description=self._text(5, 20),
+            )
+            for i in range(self.counts['groups'])
+        ))
+        self.group_ids = list(Group.objects.filter(
+            slug__startswith=f'{self.prefix}-'.lower()
+        ).values_list('pk', flat=True))
+
+    def create_images(self):
+        self.images = []
+        for i in range(self.counts['images']):
+            color = tuple(self.rng.randrange(256) for _ in range(3))
+            buffer = io.BytesIO()
+            Image.new('RGB', (1280, 720), color).save(buffer, 'JPEG')
+            self.images.append(image_storage.save(
+                f'posts/{self.prefix}_{i}.jpg', ContentFile(buffer.getvalue())
+            ))
+
+    def _follows(self):
+        # Число подписчиков автора — степенное распределение: немногие
+        # авторы собирают большую часть подписок.
+        authors = self.popularity
+        average = self.counts['follows']
+        for user_id in self.user_ids:
+            wanted = min(
+                self.rng.randint(0, average * 2), len(self.user_ids) - 1
+            )
+            followed = set()
+            for _ in range(wanted * 2):
+                if len(followed) >= wanted:
+                    break
+                author_id = authors.choice()
+                if author_id != user_id:
+                    followed.add(author_id)
+            for author_id in followed:
+                yield Follow(user_id=user_id, author_id=author_id)
+
+    def _posts(self):
+        # Популярные авторы и пишут чаще.
+        authors = self.popularity
+        for _ in range(self.counts['posts']):
+            group_id = None
+            if self.group_ids and self.rng.random() < 0.5:
+                group_id = self.rng.choice(self.group_ids)
+            image = ''
+            if self.images and self.rng.random() < 0.2:
+                image = self.rng.choice(self.images)
+            yield Post(
+                author_id=authors.choice(), group_id=group_id,
+                text=self._text(5, 60), image=image,
+                pub_date=self._random_date(),
+            )
+
+    def _comments(self, first_post, last_post):
+        posts = PowerLaw(
+            range(first_post, last_post + 1), self.alpha, self.rng
+        ) if first_post is not None else None
+        for _ in range(self.counts['comments'] if posts else 0):
+            yield Comment(
+                post_id=posts.choice(),
+                author_id=self.rng.choice(self.user_ids),
+                text=self._text(2, 20), pub_date=self._random_date(),
+            )
+
+    def run(self):
+        self.create_users()
+        self.log(f'Пользователей: {len(self.user_ids)}')
+        self.create_groups()
+        self.create_images()
+        follows = self._insert(Follow, self._follows(), ignore_conflicts=True)
+        self.log(f'Подписок: {follows}')
+        with explicit_pub_date(Post, Comment):
+            posts = self._insert(Post, self._posts())
+            self.log(f'Постов: {posts}')
+            bounds = Post.objects.filter(
+                author_id__gte=min(self.user_ids),
+                author_id__lte=max(self.user_ids),
+            ).order_by().aggregate(first=Min('pk'), last=Max('pk'))
+            comments = self._insert(
+                Comment, self._comments(bounds['first'], bounds['last'])
+            )
+            self.log(f'Комментариев: {comments}')
+        recount()
+        entries = fan_out_range(bounds['first'], bounds['last'])
+        self.log(f'Записей лент: {entries}')
+        bump_versions(GLOBAL_SCOPE)
+        return self.prefix
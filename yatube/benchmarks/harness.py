@@ -0,0 +1,242 @@
+import json
+import math
+import platform
+import random
+import subprocess
+import time
+
+import django
+from core.timing import measure
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Max, Min
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+from posts.models import Comment, Follow, Group, Post, User, UserCounters
+
+from .generate import WORDS
+
+VIEWS = (
+    'posts:index',
+    'posts:group_list',
+    'posts:profile',
+    'posts:post_detail',
+    'posts:post_comments',
+    'posts:follow_index',
+    'posts:search',
+)
+# Столько авторов с наибольшим числом подписчиков берется для профилей.
+POPULAR_AUTHORS = 1000
+LOGGED_IN_USERS = 20
+
+
+def percentile(values, fraction):
+    """Перцентиль отсортированного списка методом ближайшего ранга."""
+    if not values:
+        return None
+    return values[max(math.ceil(fraction * len(values)), 1) - 1]
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Sampler:
+    """Случайные аргументы представлений из данных текущей базы.
+
+    Профили выбираются среди популярных авторов, лента подписок —
+    у подписчиков, посты — поиском по индексу от случайного id.
+    """
+
+    def __init__(self, rng):
+        self.rng = rng
+        bounds = Post.objects.aggregate(first=Min('pk'), last=Max('pk'))
+        self.first_post, self.last_post = bounds['first'], bounds['last']
+        self.slugs = list(Group.objects.values_list('slug', flat=True))
+        self.authors = list(UserCounters.objects.order_by(
+            '-followers_count'
+        ).values_list('user__username', flat=True)[:POPULAR_AUTHORS])
+        follow_bounds = Follow.objects.aggregate(
+            first=Min('pk'), last=Max('pk')
+        )
+        followers = set()
+        for _ in range(LOGGED_IN_USERS * 5 if follow_bounds['first'] else 0):
+            follow = Follow.objects.filter(pk__gte=self.rng.randint(
+                follow_bounds['first'], follow_bounds['last']
+            )).order_by('pk').values_list('user', flat=True).first()
+            if follow is None:
+                continue
+            followers.add(follow)
+            if len(followers) >= LOGGED_IN_USERS:
+                break
+        self.clients = []
+        for user in User.objects.filter(pk__in=followers):
+            client = Client()
+            client.force_login(user)
+            self.clients.append(client)
+
+    def post_id(self, with_comments=False):
+        if self.first_post is None:
+            return None
+        posts = Post.objects.filter(
+            pk__gte=self.rng.randint(self.first_post, self.last_post)
+        ).order_by('pk')
+        if with_comments:
+            posts = posts.filter(comments_count__gt=0)
+        return posts.values_list('pk', flat=True).first()
+
+    def request(self, view):
+        """(адрес, клиент) для очередного запроса к представлению."""
+        page = {'page': self.rng.randint(1, 5)}
+        client = Client()
+        if view == 'posts:index':
+            url = reverse(view)
+        elif view == 'posts:group_list':
+            if not self.slugs:
+                return None
+            url = reverse(view, args=[self.rng.choice(self.slugs)])
+        elif view == 'posts:profile':
+            if not self.authors:
+                return None
+            url = reverse(view, args=[self.rng.choice(self.authors)])
+        elif view == 'posts:follow_index':
+            if not self.clients:
+                return None
+            url = reverse(view)
+            client = self.rng.choice(self.clients)
+        elif view == 'posts:search':
+            url = reverse(view)
+            page = {'q': self.rng.choice(WORDS)}
+        else:
+            post_id = self.post_id(view == 'posts:post_comments')
+            if post_id is None:
+                return None
+            url = reverse(view, args=[post_id])
+            page = {}
+        return url, page, client
+
+
+class Benchmark:
+    """Последовательные запросы к представлениям через тестовый клиент.
+
+    Время запроса меряется вместе с прослойками, но без сети. При
+    cold=True кэш очищается перед каждым запросом.
+    """
+
+    def __init__(self, views=VIEWS, requests=200, warmup=20, cold=False,
+                 seed=0, log=None):
+        self.views = views
+        self.requests = requests
+        self.warmup = warmup
+        self.cold = cold
+        self.seed = seed
+        self.log = log or (lambda message: None)
+
+    def run_view(self, sampler, view):
+        timings, queries, db_times, errors = [], [], [], 0
+        started = time.perf_counter()
+        busy = 0.0
+        for number in range(self.warmup + self.requests):
+            request = sampler.request(view)
+            if request is None:
+                return None
+            url, params, client = request
+            if self.cold:
+                cache.clear()
+            with measure() as stats:
+                request_started = time.perf_counter()
+                response = client.get(url, params)
+                elapsed = time.perf_counter() - request_started
+            if number < self.warmup:
+                continue
+            busy += elapsed
+            timings.append(elapsed * 1000)
+            queries.append(stats.db_count)
+            db_times.append(stats.db_time * 1000)
+            errors += response.status_code >= 400
+        wall = time.perf_counter() - started
+        timings.sort()
+        queries.sort()
+        db_times.sort()
+        return {
+            'requests': len(timings),
+            'errors': errors,
+            'p50_ms': round(percentile(timings, 0.50), 3),
+            'p95_ms': round(percentile(timings, 0.95), 3),
+            'p99_ms': round(percentile(timings, 0.99), 3),
+            'mean_ms': round(sum(timings) / len(timings), 3),
+            'max_ms': round(timings[-1], 3),
+            'throughput_rps': round(len(timings) / busy, 2),
+            'queries_p50': percentile(queries, 0.50),
+            'queries_max': queries[-1],
+            'db_p50_ms': round(percentile(db_times, 0.50), 3),
+            'wall_s': round(wall, 3),
+        }
+
+    def run(self):
+        sampler = Sampler(random.Random(self.seed))
+        results = {}
+        for view in self.views:
+            result = self.run_view(sampler, view)
+            if result is None:
+                self.log(f'{view}: нет данных, пропущено')
+                continue
+            results[view] = result
+            self.log(
+                f"{view}: p50 {result['p50_ms']} мс, "
+                f"p95 {result['p95_ms']} мс, p99 {result['p99_ms']} мс, "
+                f"{result['throughput_rps']} запр./с"
+            )
+        return {
+            'commit': git_commit(),
+            'created': timezone.now().isoformat(timespec='seconds'),
+            'environment': {
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+                'cache': settings.CACHES['default']['BACKEND'],
+            },
+            'dataset': {
+                'users': User.objects.count(),
+                'posts': Post.objects.count(),
+                'comments': Comment.objects.count(),
+                'follows': Follow.objects.count(),
+            },
+            'options': {
+                'requests': self.requests,
+                'warmup': self.warmup,
+                'cold': self.cold,
+                'seed': self.seed,
+            },
+            'results': results,
+        }
+
+
+def compare(previous, current):
+    """Строки сравнения двух прогонов по p50/p95/p99."""
+    lines = []
+    for view, result in current['results'].items():
+        before = previous.get('results', {}).get(view)
+        if before is None:
+            continue
+        changes = ', '.join(
+            f'{metric} {before[metric]} → {result[metric]} '
+            f'({(result[metric] - before[metric]) / before[metric]:+.0%})'
+            for metric in ('p50_ms', 'p95_ms', 'p99_ms')
+            if before[metric]
+        )
+        lines.append(f'{view}: {changes}')
+    return lines
+
+
+def save(report, path):
+    with open(path, 'w', encoding='utf-8') as report_file:
+        json.dump(report, report_file, ensure_ascii=False, indent=2)
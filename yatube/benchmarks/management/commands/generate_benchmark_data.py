@@ -0,0 +1,55 @@
+import time
+
+from benchmarks.generate import DataGenerator
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = (
+        'Массово создает пользователей, подписки со степенным '
+        'распределением, посты с картинками и комментарии для бенчмарков.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10000)
+        parser.add_argument('--groups', type=int, default=50)
+        parser.add_argument('--posts', type=int, default=1000000)
+        parser.add_argument('--comments', type=int, default=2000000)
+        parser.add_argument(
+            '--follows', type=int, default=50,
+            help='Среднее число подписок пользователя.'
+        )
+        parser.add_argument(
+            '--images', type=int, default=20,
+            help='Число разных картинок; ими иллюстрируется 20%% постов.'
+        )
+        parser.add_argument(
+            '--alpha', type=float, default=1.2,
+            help='Показатель степенного распределения популярности.'
+        )
+        parser.add_argument('--days', type=int, default=365)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        if options['users'] < 2:
+            raise CommandError('Нужно хотя бы два пользователя')
+        started = time.perf_counter()
+        generator = DataGenerator(
+            users=options['users'],
+            groups=options['groups'],
+            posts=options['posts'],
+            comments=options['comments'],
+            follows=options['follows'],
+            images=options['images'],
+            alpha=options['alpha'],
+            days=options['days'],
+            seed=options['seed'],
+            batch_size=options['batch_size'],
+            log=self.stdout.write,
+        )
+        prefix = generator.run()
+        self.stdout.write(self.style.SUCCESS(
+            f'Данные {prefix} созданы за '
+            f'{time.perf_counter() - started:.1f} с'
+        ))
@@ -0,0 +1,64 @@
+import json
+import os
+
+from benchmarks.harness import VIEWS, Benchmark, compare, save
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+
+class Command(BaseCommand):
+    help = (
+        'Меряет p50/p95/p99 и пропускную способность представлений '
+        'posts и сохраняет результат в JSON.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--views', nargs='+', default=VIEWS, choices=VIEWS,
+            help='Имена URL представлений.'
+        )
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--warmup', type=int, default=20)
+        parser.add_argument(
+            '--cold', action='store_true',
+            help='Очищать кэш перед каждым запросом.'
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--output',
+            help='Файл результата; по умолчанию benchmarks/results/.'
+        )
+        parser.add_argument(
+            '--compare', help='Прошлый результат для сравнения.'
+        )
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1:
+            raise CommandError('Нужен хотя бы один замеряемый запрос')
+        if options['warmup'] < 0:
+            raise CommandError('Число прогревочных запросов не меньше нуля')
+        report = Benchmark(
+            views=options['views'],
+            requests=options['requests'],
+            warmup=options['warmup'],
+            cold=options['cold'],
+            seed=options['seed'],
+            log=self.stdout.write,
+        ).run()
+        output = options['output']
+        if output is None:
+            directory = os.path.join(
+                settings.BASE_DIR, 'benchmarks', 'results'
+            )
+            os.makedirs(directory, exist_ok=True)
+            commit = (report['commit'] or 'unknown')[:12]
+            output = os.path.join(
+                directory, f'{timezone.now():%Y%m%d-%H%M%S}-{commit}.json'
+            )
+        save(report, output)
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as previous:
+                for line in compare(json.load(previous), report):
+                    self.stdout.write(line)
+        self.stdout.write(self.style.SUCCESS(f'Результат: {output}'))
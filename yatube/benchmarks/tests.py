@@ -0,0 +1,70 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from benchmarks.generate import DataGenerator
+from benchmarks.harness import Benchmark, percentile
+from django.core.management import CommandError, call_command
+from django.db.models import Count
+from django.test import TestCase, override_settings
+from posts.models import Comment, Follow, Post, TimelineEntry
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class BenchmarkTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        DataGenerator(
+            users=30, groups=2, posts=200, comments=100, follows=5,
+            images=1, batch_size=50,
+        ).run()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def test_generated_data(self):
+        """Данные созданы, популярность авторов неравномерна."""
+        self.assertEqual(Post.objects.count(), 200)
+        self.assertEqual(Comment.objects.count(), 100)
+        self.assertTrue(Post.objects.exclude(image='').exists())
+        self.assertTrue(TimelineEntry.objects.exists())
+        followers = sorted(
+            Follow.objects.values('author').annotate(
+                total=Count('pk')
+            ).values_list('total', flat=True),
+            reverse=True,
+        )
+        self.assertGreater(followers[0], followers[len(followers) // 2] * 2)
+
+    def test_percentile(self):
+        """Перцентиль берется методом ближайшего ранга."""
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 0.5), 50)
+        self.assertEqual(percentile(values, 0.99), 99)
+        self.assertIsNone(percentile([], 0.5))
+
+    def test_run_benchmarks(self):
+        """Прогон сохраняет перцентили каждого представления в JSON."""
+        report = Benchmark(requests=3, warmup=1).run()
+        self.assertEqual(report['dataset']['posts'], 200)
+        self.assertEqual(len(report['results']), 7)
+        for view, result in report['results'].items():
+            with self.subTest(view=view):
+                self.assertEqual(result['errors'], 0)
+                self.assertLessEqual(result['p50_ms'], result['p99_ms'])
+        output = os.path.join(TEMP_MEDIA_ROOT, 'result.json')
+        call_command(
+            'run_benchmarks', requests=2, warmup=0, output=output,
+            views=['posts:index'], stdout=StringIO(),
+        )
+        with open(output, encoding='utf-8') as result_file:
+            self.assertIn('posts:index', json.load(result_file)['results'])
+        with self.assertRaises(CommandError):
+            call_command('run_benchmarks', requests=0, stdout=StringIO())
@@ -0,0 +1,71 @@
+import copy
+import threading
+import time
+
+from django.conf import settings
+from django.contrib import auth
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.crypto import constant_time_compare
+
+# (путь бэкенда, id пользователя) -> (срок годности, пользователь).
+# Словарь общий для потоков сервера: вход пользователя сохраняет
+# last_login, и сигнал обходит словарь, пока другие запросы пишут в него.
+_users = {}
+_users_guard = threading.Lock()
+MAX_CACHED_USERS = 10000
+
+
+def _from_cache(request, key):
+    with _users_guard:
+        entry = _users.get(key)
+    if entry is None or entry[0] < time.monotonic():
+        return None
+    user = copy.deepcopy(entry[1])
+    session_hash = request.session.get(auth.HASH_SESSION_KEY)
+    if session_hash and constant_time_compare(
+        session_hash, user.get_session_auth_hash()
+    ):
+        return user
+    return None
+
+
+def get_user(request):
+    """auth.get_user с кэшем пользователей в памяти процесса.
+
+    Пользователь живет в кэше AUTH_USER_CACHE_TIMEOUT секунд и сбрасывается
+    сигналами при изменении в этом процессе; изменения из других
+    процессов, например смена пароля, видны не позже чем через это время.
+    Каждый запрос получает свою копию объекта.
+    """
+    timeout = settings.AUTH_USER_CACHE_TIMEOUT
+    try:
+        key = (
+            request.session[auth.BACKEND_SESSION_KEY],
+            str(request.session[auth.SESSION_KEY]),
+        )
+    except KeyError:
+        key = None
+    if timeout and key:
+        user = _from_cache(request, key)
+        if user is not None:
+            return user
+    user = auth.get_user(request)
+    if timeout and key and user.is_authenticated:
+        entry = (time.monotonic() + timeout, copy.deepcopy(user))
+        with _users_guard:
+            if len(_users) >= MAX_CACHED_USERS:
+                _users.clear()
+            _users[key] = entry
+    return user
+
+
+@receiver(post_save, sender=get_user_model(), dispatch_uid='core_auth_save')
+@receiver(
+    post_delete, sender=get_user_model(), dispatch_uid='core_auth_delete'
+)
+def forget_user(sender, instance, **kwargs):
+    with _users_guard:
+        for key in [key for key in _users if key[1] == str(instance.pk)]:
+            del _users[key]
@@ -0,0 +1,334 @@
+import glob
+import json
+import mmap
+import os
+import struct
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+
+
+HEADER = struct.Struct('<Q')
+KEY_LENGTH = struct.Struct('<I')
+VALUE = struct.Struct('<d')
+INITIAL_SIZE = 64 * 1024
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+THUMBNAIL_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _align(size):
+    return (size + 7) & ~7
+
+
+def _entries(buffer, used):
+    """Записи файла: (ключ, значение, смещение значения)."""
+    position = HEADER.size
+    used = min(used, len(buffer))
+    while position + KEY_LENGTH.size <= used:
+        (length,) = KEY_LENGTH.unpack_from(buffer, position)
+        key_end = position + KEY_LENGTH.size + length
+        value_at = _align(key_end)
+        if value_at + VALUE.size > used:
+            break
+        key = bytes(buffer[position + KEY_LENGTH.size:key_end]).decode()
+        (value,) = VALUE.unpack_from(buffer, value_at)
+        yield key, value, value_at
+        position = value_at + VALUE.size
+
+
+class MmapStore:
+    """Значения метрик одного процесса в файле, отображенном в память.
+
+    Файл — заголовок с числом занятых байт и записи
+    «длина ключа, ключ, выравнивание, double». Запись попадает в
+    файл без системных вызовов, поэтому каждый воркер пишет в свой
+    файл, а /metrics читает и складывает файлы всех воркеров.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        size = os.fstat(self._fd).st_size
+        if size < INITIAL_SIZE:
+            os.ftruncate(self._fd, INITIAL_SIZE)
+            size = INITIAL_SIZE
+        self._mmap = mmap.mmap(self._fd, size)
+        (self._used,) = HEADER.unpack_from(self._mmap, 0)
+        if not self._used:
+            self._used = HEADER.size
+            HEADER.pack_into(self._mmap, 0, self._used)
+        self._positions = {
+            key: value_at
+            for key, _, value_at in _entries(self._mmap, self._used)
+        }
+
+    def _append(self, key):
+        encoded = key.encode()
+        value_at = _align(self._used + KEY_LENGTH.size + len(encoded))
+        end = value_at + VALUE.size
+        if end > len(self._mmap):
+            size = max(len(self._mmap) * 2, _align(end))
+            self._mmap.close()
+            os.ftruncate(self._fd, size)
+            self._mmap = mmap.mmap(self._fd, size)
+        KEY_LENGTH.pack_into(self._mmap, self._used, len(encoded))
+        start = self._used + KEY_LENGTH.size
+        self._mmap[start:start + len(encoded)] = encoded
+        VALUE.pack_into(self._mmap, value_at, 0.0)
+        # Заголовок обновляется последним: читатель не увидит
+        # недописанную запись.
+        self._used = end
+        HEADER.pack_into(self._mmap, 0, self._used)
+        self._positions[key] = value_at
+        return value_at
+
+    def add(self, key, amount):
+        value_at = self._positions.get(key)
+        if value_at is None:
+            value_at = self._append(key)
+        (value,) = VALUE.unpack_from(self._mmap, value_at)
+        VALUE.pack_into(self._mmap, value_at, value + amount)
+
+    def close(self):
+        self._mmap.close()
+        os.close(self._fd)
+
+
+def read_values(directory):
+    """Складываем значения из файлов всех процессов каталога."""
+    totals = defaultdict(float)
+    for path in glob.glob(os.path.join(directory, '*.mmap')):
+        with open(path, 'rb') as store_file:
+            data = store_file.read()
+        if len(data) < HEADER.size:
+            continue
+        (used,) = HEADER.unpack_from(data, 0)
+        for key, value, _ in _entries(data, used):
+            totals[key] += value
+    return totals
+
+
+def _is_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Процесс есть, но принадлежит другому пользователю.
+        pass
+    return True
+
+
+def remove_dead_stores(directory):
+    """Удаляем файлы процессов, которых больше нет.
+
+    Значения завершившегося воркера пропадают из сумм, как при
+    перезапуске процесса; Prometheus считает это сбросом счетчика.
+    """
+    for path in glob.glob(os.path.join(directory, 'metrics-*.mmap')):
+        pid = os.path.basename(path)[len('metrics-'):-len('.mmap')]
+        if pid.isdigit() and not _is_alive(int(pid)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+class Registry:
+    """Метрики приложения и хранилище текущего процесса."""
+
+    def __init__(self):
+        self.metrics = []
+        self._lock = threading.Lock()
+        self._store = None
+        self._store_owner = None
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def _get_store(self):
+        # После fork воркер получает свой файл вместо файла родителя.
+        owner = (settings.METRICS_DIR, os.getpid())
+        if self._store_owner != owner:
+            os.makedirs(settings.METRICS_DIR, exist_ok=True)
+            remove_dead_stores(settings.METRICS_DIR)
+            self._store = MmapStore(os.path.join(
+                settings.METRICS_DIR, f'metrics-{os.getpid()}.mmap'
+            ))
+            self._store_owner = owner
+        return self._store
+
+    def add(self, key, amount):
+        if not settings.METRICS_ENABLED:
+            return
+        with self._lock:
+            self._get_store().add(key, amount)
+
+    def exposition(self):
+        """Все метрики в текстовом формате Prometheus."""
+        samples = defaultdict(list)
+        for key, value in read_values(settings.METRICS_DIR).items():
+            name, suffix, labels = json.loads(key)
+            samples[name].append((suffix, tuple(map(tuple, labels)), value))
+        lines = []
+        for metric in self.metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            lines.extend(metric.render(samples))
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+def _sample_key(name, suffix, labels):
+    return json.dumps([name, suffix, labels], ensure_ascii=False)
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace(
+        '\n', r'\n'
+    )
+
+
+def _format_sample(name, labels, value):
+    if labels:
+        pairs = ','.join(f'{label}="{_escape(v)}"' for label, v in labels)
+        name = f'{name}{{{pairs}}}'
+    if float(value).is_integer():
+        return f'{name} {int(value)}'
+    return f'{name} {value!r}'
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        registry.register(self)
+
+    def _labels(self, labels):
+        return [[name, str(labels[name])] for name in self.labelnames]
+
+    def inc(self, amount=1, **labels):
+        registry.add(
+            _sample_key(self.name, '', self._labels(labels)), amount
+        )
+
+    def render(self, samples):
+        for _, labels, value in sorted(samples.get(self.name, ())):
+            yield _format_sample(self.name, labels, value)
+
+
+class Histogram(Counter):
+    """Гистограмма: по файлу хранятся счетчики корзин, сумма и число.
+
+    Корзины пишутся без накопления, чтобы наблюдение меняло одно
+    значение, а накопленные значения считаются при выводе.
+    """
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(),
+                 buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(float(bound) for bound in buckets)
+
+    def observe(self, value, **labels):
+        labels = self._labels(labels)
+        bound = next(
+            (bound for bound in self.buckets if value <= bound), '+Inf'
+        )
+        registry.add(
+            _sample_key(self.name, '_bucket', labels + [['le', str(bound)]]),
+            1,
+        )
+        registry.add(_sample_key(self.name, '_sum', labels), value)
+        registry.add(_sample_key(self.name, '_count', labels), 1)
+
+    def render(self, samples):
+        series = defaultdict(dict)
+        for suffix, labels, value in samples.get(self.name, ()):
+            if suffix == '_bucket':
+                *labels, (_, bound) = labels
+                series[tuple(labels)][bound] = value
+            else:
+                series[labels][suffix] = value
+        for labels in sorted(series):
+            values = series[labels]
+            total = 0
+            for bound in (*map(str, self.buckets), '+Inf'):
+                total += values.get(bound, 0)
+                yield _format_sample(
+                    f'{self.name}_bucket', (*labels, ('le', bound)), total
+                )
+            yield _format_sample(
+                f'{self.name}_sum', labels, values.get('_sum', 0)
+            )
+            yield _format_sample(
+                f'{self.name}_count', labels, values.get('_count', 0)
+            )
+
+
+class HitRatio:
+    """Доля попаданий, вычисляемая из счетчика при выводе."""
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, counter, hit_values):
+        self.name = name
+        self.documentation = documentation
+        self.counter = counter
+        self.hit_values = hit_values
+        registry.register(self)
+
+    def render(self, samples):
+        index = self.counter.labelnames.index('result')
+        totals = defaultdict(lambda: [0, 0])
+        for _, labels, value in samples.get(self.counter.name, ()):
+            group = tuple(
+                pair for pair in labels if pair[0] != 'result'
+            )
+            totals[group][1] += value
+            if labels[index][1] in self.hit_values:
+                totals[group][0] += value
+        for labels, (hits, total) in sorted(totals.items()):
+            yield _format_sample(self.name, labels, hits / total)
+
+
+REQUESTS = Counter(
+    'yatube_requests_total', 'Число запросов по представлениям.',
+    ('view', 'method', 'status'),
+)
+REQUEST_LATENCY = Histogram(
+    'yatube_request_duration_seconds', 'Время обработки запроса.',
+    ('view',),
+)
+REQUEST_QUERIES = Histogram(
+    'yatube_request_db_queries', 'Число запросов к базе за запрос.',
+    ('view',), buckets=QUERY_BUCKETS,
+)
+REQUEST_DB_TIME = Histogram(
+    'yatube_request_db_seconds', 'Время запросов к базе за запрос.',
+    ('view',),
+)
+PAGE_CACHE = Counter(
+    'yatube_page_cache_total', 'Обращения к кэшу страниц лент.',
+    ('page', 'result'),
+)
+PAGE_CACHE_HIT_RATIO = HitRatio(
+    'yatube_page_cache_hit_ratio',
+    'Доля страниц, отданных из кэша, свежих или прошлых.',
+    PAGE_CACHE, ('hit', 'stale'),
+)
+THUMBNAIL_DURATION = Histogram(
+    'yatube_thumbnail_seconds', 'Время создания миниатюры.',
+    ('geometry',), buckets=THUMBNAIL_BUCKETS,
+)
@@ -0,0 +1,109 @@
+import json
+import logging
+import time
+
+from django.conf import settings
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.core.cache import caches
+from django.core.exceptions import MiddlewareNotUsed
+from django.utils.functional import SimpleLazyObject
+
+from .auth import get_user
+from .metrics import (REQUEST_DB_TIME, REQUEST_LATENCY, REQUEST_QUERIES,
+                      REQUESTS)
+from .slow_queries import current_view
+from .timing import instrument_cache, measure
+
+
+logger = logging.getLogger('yatube.timing')
+
+
+class RequestTimingMiddleware:
+    """Замеры запроса в заголовке Server-Timing и строке лога.
+
+    Считает число и время запросов к базе, время рендера шаблонов,
+    попадания и промахи кэша и общее время обработки. При выключенном
+    REQUEST_TIMING прослойка исключается из цепочки при старте.
+    """
+
+    def __init__(self, get_response):
+        if not settings.REQUEST_TIMING:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        for alias in settings.CACHES:
+            instrument_cache(caches[alias])
+        with measure() as stats:
+            response = self.get_response(request)
+        response['Server-Timing'] = stats.server_timing()
+        if logger.isEnabledFor(logging.INFO):
+            match = request.resolver_match
+            logger.info(json.dumps({
+                'view': match.view_name if match else None,
+                'method': request.method,
+                'path': request.path,
+                'status': response.status_code,
+                **stats.as_dict(),
+            }))
+        return response
+
+
+class MetricsMiddleware:
+    """Счетчики и гистограммы запросов по именам URL для /metrics."""
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        with measure() as stats:
+            queries, db_time = stats.db_count, stats.db_time
+            response = self.get_response(request)
+            queries = stats.db_count - queries
+            db_time = stats.db_time - db_time
+        match = request.resolver_match
+        # Неизвестные адреса не плодят отдельные ряды метрик.
+        view = match.view_name if match else 'unresolved'
+        REQUESTS.inc(
+            view=view, method=request.method, status=response.status_code
+        )
+        REQUEST_LATENCY.observe(time.perf_counter() - started, view=view)
+        REQUEST_QUERIES.observe(queries, view=view)
+        REQUEST_DB_TIME.observe(db_time, view=view)
+        return response
+
+
+class SlowQueryMiddleware:
+    """Запоминаем имя представления для записей лога медленных запросов."""
+
+    def __init__(self, get_response):
+        if settings.SLOW_QUERY_THRESHOLD_MS is None:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = current_view.set(None)
+        try:
+            return self.get_response(request)
+        finally:
+            current_view.reset(token)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        current_view.set(request.resolver_match.view_name)
+
+
+def _request_user(request):
+    if not hasattr(request, '_cached_user'):
+        request._cached_user = get_user(request)
+    return request._cached_user
+
+
+class CachedAuthenticationMiddleware(AuthenticationMiddleware):
+    """AuthenticationMiddleware, берущий пользователя из кэша процесса."""
+
+    def process_request(self, request):
+        super().process_request(request)
+        request.user = SimpleLazyObject(lambda: _request_user(request))
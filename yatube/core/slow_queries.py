@@ -0,0 +1,152 @@
+import glob
+import hashlib
+import json
+import logging
+import logging.handlers
+import os
+import re
+import time
+import traceback
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.utils import timezone
+
+
+logger = logging.getLogger('yatube.slow_queries')
+
+current_view = ContextVar('slow_query_view', default=None)
+_explaining = ContextVar('slow_query_explaining', default=False)
+_explained = set()
+# Сколько разных запросов помнить, чтобы не объяснять их повторно.
+MAX_EXPLAINED = 1000
+MAX_PARAMS_LENGTH = 500
+_PLACEHOLDERS = re.compile(r'%s(?:\s*,\s*%s)+')
+_THIS_FILE = os.path.abspath(__file__)
+
+
+class RotatingLogHandler(logging.handlers.RotatingFileHandler):
+    """RotatingFileHandler, который сам создает каталог лога."""
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.baseFilename), exist_ok=True)
+        return super()._open()
+
+
+def fingerprint(sql):
+    """Отпечаток запроса: списки IN (%s, %s, ...) схлопываются."""
+    normalized = _PLACEHOLDERS.sub('%s, ...', sql)
+    return hashlib.md5(normalized.encode()).hexdigest()[:12]
+
+
+def _origin():
+    """Ближайшая к запросу строка кода проекта вне библиотек."""
+    for frame in reversed(traceback.extract_stack()):
+        filename = os.path.abspath(frame.filename)
+        if (
+            filename.startswith(settings.BASE_DIR)
+            and filename != _THIS_FILE
+            and 'site-packages' not in filename
+        ):
+            relative = os.path.relpath(filename, settings.BASE_DIR)
+            return f'{relative}:{frame.lineno} in {frame.name}'
+    return None
+
+
+def _explain(connection, sql, params):
+    prefix = connection.ops.explain_query_prefix()
+    token = _explaining.set(True)
+    try:
+        with connection.cursor() as cursor:
+            # Курсор бэкенда минует обертки и журнал запросов Django.
+            cursor.cursor.execute(f'{prefix} {sql}', params)
+            return [str(row[-1]) for row in cursor.cursor.fetchall()]
+    except Exception as error:
+        return [f'EXPLAIN не выполнен: {error}']
+    finally:
+        _explaining.reset(token)
+
+
+def _record(connection, sql, params, many, duration):
+    key = fingerprint(sql)
+    plan = None
+    is_select = sql.split(None, 1)[0].upper() in ('SELECT', 'WITH')
+    if key not in _explained and is_select and not many:
+        if len(_explained) >= MAX_EXPLAINED:
+            _explained.clear()
+        _explained.add(key)
+        plan = _explain(connection, sql, params)
+    logger.warning(json.dumps({
+        'time': timezone.now().isoformat(timespec='seconds'),
+        'fingerprint': key,
+        'duration_ms': round(duration * 1000, 2),
+        'sql': sql,
+        'params': repr(params)[:MAX_PARAMS_LENGTH],
+        'view': current_view.get(),
+        'origin': _origin(),
+        'plan': plan,
+    }, ensure_ascii=False))
+
+
+class SlowQueryWrapper:
+    """Обертка выполнения запросов, записывающая медленные в лог."""
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __call__(self, execute, sql, params, many, context):
+        threshold = settings.SLOW_QUERY_THRESHOLD_MS
+        if threshold is None or _explaining.get():
+            return execute(sql, params, many, context)
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            if duration * 1000 >= threshold:
+                _record(self.connection, sql, params, many, duration)
+
+
+@receiver(connection_created, dispatch_uid='core_slow_queries')
+def install_wrapper(sender, connection, **kwargs):
+    if connection.alias != DEFAULT_DB_ALIAS:
+        return
+    if not any(
+        isinstance(wrapper, SlowQueryWrapper)
+        for wrapper in connection.execute_wrappers
+    ):
+        # Соединение может открыться внутри execute_wrapper(), который
+        # снимает последнюю обертку списка, поэтому ставим свою первой.
+        connection.execute_wrappers.insert(0, SlowQueryWrapper(connection))
+
+
+def read_log():
+    """Сводка по отпечаткам из текущего и ротированных файлов лога."""
+    summary = {}
+    paths = sorted(
+        glob.glob(f'{settings.SLOW_QUERY_LOG}.*'), reverse=True
+    ) + [settings.SLOW_QUERY_LOG]
+    for path in paths:
+        if not os.path.exists(path):
+            continue
+        with open(path, encoding='utf-8') as log_file:
+            for line in log_file:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                item = summary.setdefault(entry['fingerprint'], {
+                    **entry, 'count': 0, 'total_ms': 0, 'max_ms': 0,
+                })
+                item['count'] += 1
+                item['total_ms'] += entry['duration_ms']
+                item['max_ms'] = max(item['max_ms'], entry['duration_ms'])
+                item['plan'] = item['plan'] or entry['plan']
+                item['last_view'] = entry['view']
+                item['last_time'] = entry['time']
+    return sorted(
+        summary.values(), key=lambda item: item['total_ms'], reverse=True
+    )
@@ -0,0 +1,159 @@
+import gzip
+import mimetypes
+import os
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import (ManifestStaticFilesStorage,
+                                                staticfiles_storage)
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponseNotModified
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli не установлен
+    brotli = None
+
+
+# Сжимаются только текстовые форматы: картинки и шрифты уже сжаты.
+COMPRESSIBLE_EXTENSIONS = (
+    '.css', '.js', '.map', '.json', '.svg', '.txt', '.html', '.xml', '.ico',
+)
+# Маленькие файлы и файлы, сжатые хуже чем на 5%, не сжимаются.
+MIN_COMPRESS_SIZE = 256
+MIN_COMPRESS_RATIO = 0.95
+IMMUTABLE_MAX_AGE = 60 * 60 * 24 * 365
+
+
+def _gzip(data):
+    # mtime=0: одинаковые файлы дают одинаковый архив при каждой сборке.
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def _brotli(data):
+    return brotli.compress(data, quality=11)
+
+
+# Кодировки в порядке предпочтения сервера: (Content-Encoding, суффикс).
+ENCODINGS = [('gzip', '.gz', _gzip)]
+if brotli is not None:
+    ENCODINGS.insert(0, ('br', '.br', _brotli))
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """Статика с хэшем содержимого в имени и заранее сжатыми копиями.
+
+    collectstatic пишет манифест, а рядом с каждым текстовым файлом —
+    копии .gz и, если установлен brotli, .br. Файл без записи в манифесте,
+    например до первого collectstatic, отдается под исходным именем.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._hashed_names = None
+
+    def stored_name(self, name):
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            return name
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        self._hashed_names = None
+        if dry_run:
+            return
+        for name in {*paths, *self.hashed_files.values()}:
+            if name.endswith(COMPRESSIBLE_EXTENSIONS):
+                self.compress(name)
+
+    def compress(self, name):
+        path = self.path(name)
+        with open(path, 'rb') as source:
+            data = source.read()
+        for _, suffix, compress in ENCODINGS:
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+            if len(data) < MIN_COMPRESS_SIZE:
+                continue
+            compressed = compress(data)
+            if len(compressed) <= len(data) * MIN_COMPRESS_RATIO:
+                with open(path + suffix, 'wb') as target:
+                    target.write(compressed)
+
+    def is_immutable(self, name):
+        """Имя содержит хэш содержимого, и файл по нему не изменится."""
+        if self._hashed_names is None:
+            self._hashed_names = frozenset(self.hashed_files.values())
+        return name in self._hashed_names
+
+
+def accepted_encodings(header):
+    """Кодировки из Accept-Encoding, кроме запрещенных через q=0."""
+    accepted = set()
+    for item in header.split(','):
+        coding, *params = [part.strip() for part in item.split(';')]
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition('=')
+            if key.strip() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if coding and quality > 0:
+            accepted.add(coding.lower())
+    return accepted
+
+
+def _choose_file(request, full_path):
+    accepted = accepted_encodings(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+    for coding, suffix, _ in ENCODINGS:
+        if coding in accepted and os.path.isfile(full_path + suffix):
+            return coding, full_path + suffix
+    return None, full_path
+
+
+def serve(request, path):
+    """Отдаем собранную статику из STATIC_ROOT.
+
+    Из сжатых копий выбирается первая, которую принимает клиент. Файлы
+    с хэшем в имени кэшируются навсегда (immutable), остальные браузер
+    перепроверяет через STATIC_MAX_AGE секунд.
+    """
+    storage = staticfiles_storage
+    try:
+        full_path = storage.path(path)
+    except SuspiciousFileOperation:
+        raise Http404
+    if path.endswith(tuple(suffix for _, suffix, _ in ENCODINGS)):
+        raise Http404
+    if not os.path.isfile(full_path):
+        raise Http404
+    stat = os.stat(full_path)
+    if not was_modified_since(
+        request.META.get('HTTP_IF_MODIFIED_SINCE'), stat.st_mtime, stat.st_size
+    ):
+        return HttpResponseNotModified()
+    encoding, served_path = _choose_file(request, full_path)
+    content_type = mimetypes.guess_type(full_path)[0]
+    response = FileResponse(
+        open(served_path, 'rb'),
+        content_type=content_type or 'application/octet-stream',
+    )
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    if encoding:
+        response['Content-Encoding'] = encoding
+    if path.endswith(COMPRESSIBLE_EXTENSIONS):
+        patch_vary_headers(response, ('Accept-Encoding',))
+    if storage.is_immutable(path):
+        patch_cache_control(
+            response, public=True, max_age=IMMUTABLE_MAX_AGE, immutable=True
+        )
+    else:
+        patch_cache_control(
+            response, public=True, max_age=settings.STATIC_MAX_AGE
+        )
+    return response
@@ -0,0 +1,314 @@
+import gzip
+import json
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from unittest import mock
+
+from core.auth import get_user
+from core.metrics import MmapStore, read_values, registry
+from core.slow_queries import read_log
+from core.staticfiles import ENCODINGS
+from django.core.cache import cache
+from django.core.management import call_command
+from django.contrib.sessions.backends.cached_db import SessionStore
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from posts.models import Post, User
+
+
+@override_settings(REQUEST_TIMING=True)
+class RequestTimingTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Timed')
+        Post.objects.create(author=cls.user, text='Пост')
+
+    def setUp(self):
+        self.client = Client()
+        cache.clear()
+
+    def test_server_timing_header(self):
+        """Заголовок и строка лога содержат замеры запроса."""
+        with self.assertLogs('yatube.timing', 'INFO') as logs:
+            response = self.client.get(reverse('posts:index'))
+        self.assertIn('db;dur=', response['Server-Timing'])
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['view'], 'posts:index')
+        self.assertGreater(record['db_queries'], 0)
+        self.assertGreater(record['template_ms'], 0)
+        self.assertGreater(record['cache_misses'], 0)
+
+    def test_cached_page_counts_hits(self):
+        """Повторная страница берется из кэша без запросов к базе."""
+        url = reverse('posts:index')
+        self.client.get(url)
+        with self.assertLogs('yatube.timing', 'INFO') as logs:
+            self.client.get(url)
+        record = json.loads(logs.records[0].getMessage())
+        self.assertGreater(record['cache_hits'], 0)
+        self.assertEqual(record['db_queries'], 0)
+        self.assertEqual(record['template_ms'], 0)
+
+    def test_log_written_at_info(self):
+        """У лога есть обработчик, а без уровня INFO строка не собирается."""
+        logger = logging.getLogger('yatube.timing')
+        self.assertTrue(logger.isEnabledFor(logging.INFO))
+        self.assertTrue(logger.handlers)
+        logger.setLevel(logging.WARNING)
+        self.addCleanup(logger.setLevel, logging.INFO)
+        with mock.patch('core.middleware.json') as middleware_json:
+            response = self.client.get(reverse('posts:index'))
+        self.assertTrue(response.has_header('Server-Timing'))
+        middleware_json.dumps.assert_not_called()
+
+    @override_settings(REQUEST_TIMING=False)
+    def test_disabled(self):
+        """Выключенная прослойка не добавляет заголовок."""
+        response = Client().get(reverse('posts:index'))
+        self.assertFalse(response.has_header('Server-Timing'))
+
+
+class MetricsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Measured')
+        Post.objects.create(author=cls.user, text='Пост')
+
+    def setUp(self):
+        self.metrics_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.metrics_dir)
+        override = override_settings(
+            METRICS_ENABLED=True, METRICS_DIR=self.metrics_dir
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+        self.client = Client()
+        cache.clear()
+
+    def test_store_grows_and_reopens(self):
+        """Значения переживают расширение файла и повторное открытие."""
+        path = os.path.join(self.metrics_dir, 'worker.mmap')
+        store = MmapStore(path)
+        for i in range(5000):
+            store.add(f'key-{i}', i)
+        store.add('key-1', 0.5)
+        store.close()
+        store = MmapStore(path)
+        store.add('key-2', 1)
+        store.close()
+        values = read_values(self.metrics_dir)
+        self.assertEqual(len(values), 5000)
+        self.assertEqual(values['key-1'], 1.5)
+        self.assertEqual(values['key-2'], 3)
+
+    def test_metrics_endpoint(self):
+        """/metrics выводит счетчики представлений и кэша страниц."""
+        url = reverse('posts:index')
+        self.client.get(url)
+        self.client.get(url)
+        response = self.client.get('/metrics')
+        text = response.content.decode()
+        self.assertIn(
+            'yatube_requests_total'
+            '{view="posts:index",method="GET",status="200"} 2',
+            text,
+        )
+        self.assertIn(
+            'yatube_request_duration_seconds_count{view="posts:index"} 2',
+            text,
+        )
+        self.assertIn(
+            'yatube_page_cache_hit_ratio{page="index_page"} 0.5', text
+        )
+
+    def test_workers_aggregated(self):
+        """Значения из файлов разных процессов складываются."""
+        self.client.get(reverse('posts:index'))
+        before = read_values(self.metrics_dir)
+        key = next(iter(before))
+        worker = MmapStore(os.path.join(self.metrics_dir, 'other.mmap'))
+        worker.add(key, 2)
+        worker.close()
+        self.assertEqual(read_values(self.metrics_dir)[key], before[key] + 2)
+        self.assertIn('# TYPE yatube_requests_total counter',
+                      registry.exposition())
+
+    def test_dead_process_files_removed(self):
+        """Файл завершившегося процесса удаляется, чужие файлы остаются."""
+        process = subprocess.run(
+            [sys.executable, '-c', 'import os; print(os.getpid())'],
+            capture_output=True, text=True, check=True,
+        )
+        dead = os.path.join(
+            self.metrics_dir, f'metrics-{process.stdout.strip()}.mmap'
+        )
+        other = os.path.join(self.metrics_dir, 'other.mmap')
+        for path in (dead, other):
+            MmapStore(path).close()
+        self.client.get(reverse('posts:index'))
+        self.assertFalse(os.path.exists(dead))
+        self.assertTrue(os.path.exists(other))
+        self.assertTrue(os.path.exists(os.path.join(
+            self.metrics_dir, f'metrics-{os.getpid()}.mmap'
+        )))
+
+
+class SlowQueryLogTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Slow')
+        cls.admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass'
+        )
+        Post.objects.create(author=cls.user, text='Пост')
+
+    def setUp(self):
+        log_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, log_dir)
+        self.log = os.path.join(log_dir, 'slow.log')
+        handler = logging.getLogger('yatube.slow_queries').handlers[0]
+        self.addCleanup(handler.close)
+        self.addCleanup(setattr, handler, 'baseFilename', handler.baseFilename)
+        handler.close()
+        handler.baseFilename = self.log
+        override = override_settings(
+            SLOW_QUERY_THRESHOLD_MS=0, SLOW_QUERY_LOG=self.log
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+        cache.clear()
+
+    def test_slow_queries_logged_with_plan(self):
+        """Запросы пишутся с представлением, строкой кода и планом."""
+        Client().get(reverse('posts:profile', args=['Slow']))
+        queries = read_log()
+        self.assertTrue(queries)
+        posts_query = next(
+            query for query in queries if 'FROM "posts_post"' in query['sql']
+        )
+        self.assertEqual(posts_query['view'], 'posts:profile')
+        self.assertTrue(posts_query['origin'])
+        self.assertTrue(posts_query['plan'])
+
+    def test_admin_page(self):
+        """Сводка доступна администратору и закрыта от остальных."""
+        url = reverse('slow_queries')
+        response = Client().get(url)
+        self.assertEqual(response.status_code, 302)
+        client = Client()
+        client.force_login(SlowQueryLogTest.admin)
+        response = client.get(url)
+        self.assertTemplateUsed(response, 'core/slow_queries.html')
+        self.assertContains(response, 'auth_user')
+
+
+@override_settings(
+    SESSION_ENGINE='django.contrib.sessions.backends.cached_db',
+    AUTH_USER_CACHE_TIMEOUT=30,
+)
+class CachedAuthenticationTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(
+            username='Session', password='secret-1'
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.login(username='Session', password='secret-1')
+
+    def make_request(self):
+        request = RequestFactory().get('/')
+        request.session = SessionStore(self.client.session.session_key)
+        return request
+
+    def test_warm_request_without_queries(self):
+        """Повторный запрос берет сессию и пользователя из кэшей."""
+        self.assertEqual(get_user(self.make_request()), self.user)
+        with self.assertNumQueries(0):
+            user = get_user(self.make_request())
+        self.assertEqual(user, self.user)
+        self.assertIsNot(user, get_user(self.make_request()))
+
+    def test_password_change_logs_out(self):
+        """Смена пароля сбрасывает кэш и разлогинивает старую сессию."""
+        get_user(self.make_request())
+        self.user.set_password('secret-2')
+        self.user.save()
+        self.assertFalse(get_user(self.make_request()).is_authenticated)
+
+
+class StaticFilesTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.source = tempfile.mkdtemp()
+        cls.root = tempfile.mkdtemp()
+        cls.css = b'body { margin: 0; }\n' * 100
+        os.makedirs(os.path.join(cls.source, 'css'))
+        os.makedirs(os.path.join(cls.source, 'img'))
+        with open(os.path.join(cls.source, 'css', 'site.css'), 'wb') as file:
+            file.write(cls.css)
+        with open(os.path.join(cls.source, 'img', 'logo.png'), 'wb') as file:
+            file.write(os.urandom(1024))
+        cls.settings = override_settings(
+            STATICFILES_DIRS=[cls.source], STATIC_ROOT=cls.root
+        )
+        cls.settings.enable()
+        call_command('collectstatic', interactive=False, verbosity=0)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.settings.disable()
+        shutil.rmtree(cls.source, ignore_errors=True)
+        shutil.rmtree(cls.root, ignore_errors=True)
+        super().tearDownClass()
+
+    def get(self, url, **headers):
+        response = self.client.get(url, **headers)
+        content = b''.join(response.streaming_content)
+        response.close()
+        return response, content
+
+    def test_hashed_names_and_compressed_copies(self):
+        """Ссылки ведут на имена с хэшем, текст сжат заранее."""
+        url = staticfiles_storage.url('css/site.css')
+        self.assertRegex(url, r'^/static/css/site\.[0-9a-f]{12}\.css$')
+        name = url[len('/static/'):]
+        for _, suffix, _ in ENCODINGS:
+            with self.subTest(suffix=suffix):
+                self.assertTrue(staticfiles_storage.exists(name + suffix))
+        logo = staticfiles_storage.url('img/logo.png')[len('/static/'):]
+        self.assertFalse(staticfiles_storage.exists(logo + '.gz'))
+
+    def test_serve_precompressed_immutable(self):
+        """Сжатая копия выбирается по Accept-Encoding, кэш — навсегда."""
+        url = staticfiles_storage.url('css/site.css')
+        response, content = self.get(url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(content), self.css)
+        self.assertEqual(response['Content-Type'], 'text/css')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertIn('immutable', response['Cache-Control'])
+        for header in ('', 'gzip;q=0, identity'):
+            with self.subTest(header=header):
+                response, content = self.get(url, HTTP_ACCEPT_ENCODING=header)
+                self.assertFalse(response.has_header('Content-Encoding'))
+                self.assertEqual(content, self.css)
+        response, content = self.get('/static/css/site.css')
+        self.assertEqual(content, self.css)
+        self.assertNotIn('immutable', response['Cache-Control'])
+        for url in ('/static/css/missing.css', '/static/../settings.py',
+                    url + '.gz'):
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 404)
@@ -0,0 +1,164 @@
+import time
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.db import connections
+from django.template.backends.django import DjangoTemplates, Template
+
+_current = ContextVar('request_stats', default=None)
+_in_get_many = ContextVar('cache_get_many', default=False)
+_MISSING = object()
+
+
+class RequestStats:
+    """Замеры одного запроса: база, шаблоны, кэш и общее время."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.total = 0.0
+        self.db_count = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._template_depth = 0
+
+    def finish(self):
+        self.total = time.perf_counter() - self.started
+
+    def as_dict(self):
+        return {
+            'total_ms': round(self.total * 1000, 2),
+            'db_queries': self.db_count,
+            'db_ms': round(self.db_time * 1000, 2),
+            'template_ms': round(self.template_time * 1000, 2),
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+        }
+
+    def server_timing(self):
+        """Значение заголовка Server-Timing."""
+        return ', '.join((
+            f'db;dur={self.db_time * 1000:.2f};'
+            f'desc="{self.db_count} queries"',
+            f'tpl;dur={self.template_time * 1000:.2f}',
+            f'cache;desc="{self.cache_hits} hits, '
+            f'{self.cache_misses} misses"',
+            f'total;dur={self.total * 1000:.2f}',
+        ))
+
+
+def current_stats():
+    return _current.get()
+
+
+@contextmanager
+def collect():
+    """Собираем замеры кода внутри блока в новый RequestStats."""
+    stats = RequestStats()
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        stats.finish()
+        _current.reset(token)
+
+
+@contextmanager
+def measure():
+    """Замеры запроса вместе с обертками подключений к базе.
+
+    Вложенный вызов возвращает уже идущие замеры, поэтому прослойки
+    логирования и метрик делят одни обертки.
+    """
+    stats = _current.get()
+    if stats is not None:
+        yield stats
+        return
+    with collect() as stats, ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(db_wrapper))
+        yield stats
+
+
+def db_wrapper(execute, sql, params, many, context):
+    """Обертка connection.execute_wrapper: число и время запросов."""
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.db_count += 1
+        stats.db_time += time.perf_counter() - started
+
+
+def _record_cache(hits, misses):
+    stats = _current.get()
+    if stats is not None:
+        stats.cache_hits += hits
+        stats.cache_misses += misses
+
+
+def instrument_cache(backend):
+    """Считаем попадания get/get_many экземпляра бэкенда кэша.
+
+    Экземпляры бэкендов у Django свои в каждом потоке, поэтому
+    обертка ставится на объект, а не на класс, и только один раз.
+    """
+    if getattr(backend, '_timing_instrumented', False):
+        return
+    get, get_many = backend.get, backend.get_many
+
+    def timed_get(key, default=None, version=None):
+        if _in_get_many.get():
+            return get(key, default, version=version)
+        value = get(key, _MISSING, version=version)
+        if value is _MISSING:
+            _record_cache(0, 1)
+            return default
+        _record_cache(1, 0)
+        return value
+
+    def timed_get_many(keys, version=None):
+        keys = list(keys)
+        # BaseCache.get_many вызывает get для каждого ключа.
+        token = _in_get_many.set(True)
+        try:
+            values = get_many(keys, version=version)
+        finally:
+            _in_get_many.reset(token)
+        _record_cache(len(values), len(keys) - len(values))
+        return values
+
+    backend.get = timed_get
+    backend.get_many = timed_get_many
+    backend._timing_instrumented = True
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        stats = _current.get()
+        if stats is None:
+            return super().render(context, request)
+        # Вложенный render_to_string уже учтен во внешнем шаблоне.
+        stats._template_depth += 1
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            stats._template_depth -= 1
+            if not stats._template_depth:
+                stats.template_time += time.perf_counter() - started
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """Бэкенд шаблонов Django, засекающий время рендера для замеров."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return TimedTemplate(template.template, self)
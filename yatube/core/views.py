@@ -1,5 +1,10 @@
+from django.conf import settings
+from django.http import Http404, HttpResponse
 from django.shortcuts import render
 
+from .metrics import CONTENT_TYPE, registry
+from .slow_queries import read_log
+
 
 def page_not_found(request, exception):
     return render(request, 'core/404.html', {'path': request.path}, status=404)
@@ -7,3 +12,18 @@ def page_not_found(request, exception):
 
 def csrf_failure(request, reason=''):
     return render(request, 'core/403csrf.html')
+
+
+def metrics(request):
+    if not settings.METRICS_ENABLED:
+        raise Http404
+    return HttpResponse(registry.exposition(), content_type=CONTENT_TYPE)
+
+
+def slow_queries(request):
+    context = {
+        'title': 'Медленные запросы',
+        'queries': read_log(),
+        'threshold': settings.SLOW_QUERY_THRESHOLD_MS,
+    }
+    return render(request, 'core/slow_queries.html', context)
@@ -1,6 +1,7 @@
 from django.contrib import admin
 
 from .models import Comment, Follow, Group, Post
+from .search import build_match_query, is_supported, matching_ids
 
 
 class PostAdmin(admin.ModelAdmin):
@@ -16,6 +17,16 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        # Вместо LIKE '%...%' по всей таблице ищем по индексу FTS5.
+        if not search_term or not is_supported(queryset.db):
+            return super().get_search_results(
+                request, queryset, search_term
+            )
+        if not build_match_query(search_term):
+            return queryset.none(), False
+        return queryset.filter(pk__in=matching_ids(search_term)), False
+
 
 class GroupAdmin(admin.ModelAdmin):
     list_display = (
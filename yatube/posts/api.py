@@ -0,0 +1,113 @@
+from urllib.parse import urlencode
+
+from django.db.models import F
+from django.http import JsonResponse
+from django.views.decorators.http import require_safe
+
+from .caching import (conditional_page, follow_scopes, group_scopes,
+                      index_scopes, post_scopes, profile_scopes)
+from .models import Group, Post, User
+from .paginators import CursorPaginator
+from .timeline import follow_feed
+
+
+API_PAGE_SIZE = 20
+POST_FIELDS = ('id', 'text', 'pub_date', 'image')
+
+
+def post_values(queryset, *extra):
+    """Строки постов для JSON без создания моделей."""
+    return queryset.values(
+        *POST_FIELDS, *extra,
+        author_name=F('author__username'),
+        group_slug=F('group__slug'),
+    )
+
+
+def serialize_post(row):
+    storage = Post._meta.get_field('image').storage
+    return {
+        'id': row['id'],
+        'author': row['author_name'],
+        'group': row['group_slug'],
+        'text': row['text'],
+        'pub_date': row['pub_date'].isoformat(),
+        'image': storage.url(row['image']) if row['image'] else None,
+    }
+
+
+def json_response(data, status=200):
+    return JsonResponse(
+        data, status=status, json_dumps_params={'ensure_ascii': False}
+    )
+
+
+def not_found():
+    return json_response({'detail': 'Не найдено'}, status=404)
+
+
+def _page_url(request, direction, cursor):
+    if cursor is None:
+        return None
+    return request.build_absolute_uri(
+        f'{request.path}?{urlencode({direction: cursor})}'
+    )
+
+
+def feed_response(request, posts, key=('pub_date', 'id')):
+    """Страница ленты с курсорами соседних страниц."""
+    extra = [field for field in key if field not in POST_FIELDS]
+    paginator = CursorPaginator(
+        post_values(posts, *extra), API_PAGE_SIZE, key=key
+    )
+    page = paginator.get_cursor_page(
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+    )
+    return json_response({
+        'results': [serialize_post(row) for row in page],
+        'next': _page_url(request, 'after', page.next_cursor()),
+        'previous': _page_url(request, 'before', page.previous_cursor()),
+    })
+
+
+@require_safe
+@conditional_page(index_scopes)
+def index(request):
+    return feed_response(request, Post.objects.all())
+
+
+@require_safe
+@conditional_page(group_scopes)
+def group_posts(request, slug):
+    group = Group.objects.filter(slug=slug).first()
+    if group is None:
+        return not_found()
+    return feed_response(request, group.posts.all())
+
+
+@require_safe
+@conditional_page(profile_scopes)
+def profile(request, username):
+    author = User.objects.filter(username=username).first()
+    if author is None:
+        return not_found()
+    return feed_response(request, author.posts.all())
+
+
+@require_safe
+@conditional_page(post_scopes)
+def post_detail(request, post_id):
+    row = post_values(Post.objects.filter(pk=post_id)).first()
+    if row is None:
+        return not_found()
+    return json_response(serialize_post(row))
+
+
+@require_safe
+@conditional_page(follow_scopes)
+def follow_index(request):
+    if not request.user.is_authenticated:
+        return json_response({'detail': 'Требуется вход'}, status=401)
+    posts, key = follow_feed(request.user)
+    return feed_response(request, posts, key)
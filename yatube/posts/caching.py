@@ -0,0 +1,270 @@
+import hashlib
+import time
+from datetime import datetime, timezone
+from functools import wraps
+
+from core.metrics import PAGE_CACHE
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.http import condition
+
+from .locks import single_flight
+from .models import Comment, Follow, Group, Post
+
+
+VERSION_KEY = 'posts:version:{}'
+GLOBAL_SCOPE = 'global'
+
+
+def _new_version():
+    # Версия по времени не совпадет со старыми ключами, если счетчик
+    # был вытеснен из кэша.
+    return time.time_ns()
+
+
+def get_versions(scopes):
+    """Текущие версии областей кэша парами (область, версия)."""
+    scopes = [GLOBAL_SCOPE, *scopes]
+    keys = [VERSION_KEY.format(scope) for scope in scopes]
+    versions = cache.get_many(keys)
+    missing = {key: _new_version() for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, None)
+        versions.update(missing)
+    return [(scope, versions[key]) for scope, key in zip(scopes, keys)]
+
+
+def _format_versions(versions):
+    return '.'.join(f'{scope}:{version}' for scope, version in versions)
+
+
+def get_version_prefix(scopes):
+    """Собираем префикс ключа из текущих версий областей кэша."""
+    return _format_versions(get_versions(scopes))
+
+
+def bump_versions(*scopes):
+    """Инвалидируем страницы областей, меняя их версии.
+
+    Новая версия — текущее время, а не incr: в файловом кэше incr не
+    атомарен между процессами, и две одновременные записи дали бы одну
+    и ту же версию.
+    """
+    cache.set_many(
+        {VERSION_KEY.format(scope): _new_version() for scope in scopes},
+        None,
+    )
+
+
+def feed_count_key(name, scopes):
+    """Ключ числа постов ленты с версиями ее областей кэша.
+
+    Сигналы, которые сбрасывают страницы ленты, меняют и этот ключ,
+    поэтому число не переживает новые посты и подписки.
+    """
+    return f'{name}:{get_version_prefix(scopes)}'
+
+
+def _page_key(request, prefix):
+    """Ключ страницы с учетом пользователя и его CSRF-куки."""
+    vary = ''
+    if request.user.is_authenticated:
+        csrf_cookie = request.COOKIES.get(settings.CSRF_COOKIE_NAME, '')
+        vary = f'{request.user.pk}:{csrf_cookie}'
+    url = hashlib.md5(request.build_absolute_uri().encode()).hexdigest()
+    vary = hashlib.md5(vary.encode()).hexdigest()
+    return f'posts:page:{prefix}:{url}:{vary}'
+
+
+def _store_page(request, response, fresh_key, stale_key, timeout):
+    if response.streaming or response.status_code != 200:
+        return
+    if hasattr(response, 'render') and callable(response.render):
+        response.render()
+    cache.set(fresh_key, response, timeout)
+    # Прошлую копию могут отдать после новых записей; condition() не
+    # перезаписывает готовые заголовки, поэтому она уходит с ETag и
+    # Last-Modified своей версии, а не текущей.
+    etag = getattr(request, '_page_etag', None)
+    if etag is not None:
+        response['ETag'] = quote_etag(etag)
+    last_modified = getattr(request, '_page_last_modified', None)
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    cache.set(stale_key, response, timeout + settings.POSTS_CACHE_STALE_GRACE)
+
+
+def _view_scopes(request, scopes, args, kwargs):
+    # Области страницы нужны и conditional_page, и кэшу страниц;
+    # запоминаем их, чтобы не повторять запрос post_scopes.
+    if not hasattr(request, '_page_scopes'):
+        request._page_scopes = scopes(*args, **kwargs)
+    return request._page_scopes
+
+
+def cache_page_versioned(scopes, timeout=None):
+    """Кэш страниц с версионированными ключами и защитой от лавины.
+
+    scopes получает аргументы представления и возвращает области кэша,
+    версии которых повышают сигналы при изменении постов, комментариев
+    и групп. Устаревшую страницу пересчитывает один запрос, остальные
+    в это время получают прошлую копию.
+    """
+    def decorator(view_func):
+        name = view_func.__name__
+        page = f'{name}_page'
+
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view_func(request, *args, **kwargs)
+            versions = get_version_prefix(
+                _view_scopes(request, scopes, args, kwargs)
+            )
+            fresh_key = _page_key(request, f'{name}:{versions}')
+            response = cache.get(fresh_key)
+            if response is not None:
+                PAGE_CACHE.inc(page=page, result='hit')
+                return response
+            stale_key = _page_key(request, f'{name}:stale')
+            lock_timeout = settings.POSTS_CACHE_LOCK_TIMEOUT
+            with single_flight(fresh_key, lock_timeout) as leader:
+                if not leader:
+                    response = cache.get(stale_key)
+                    if response is not None:
+                        PAGE_CACHE.inc(page=page, result='stale')
+                        return response
+                PAGE_CACHE.inc(page=page, result='miss')
+                response = view_func(request, *args, **kwargs)
+                if leader:
+                    _store_page(
+                        request, response, fresh_key, stale_key,
+                        timeout or settings.POSTS_CACHE_TIMEOUT,
+                    )
+            return response
+        return wrapper
+    return decorator
+
+
+def _viewer_scopes(request):
+    if request.user.is_authenticated:
+        return [f'viewer:{request.user.pk}']
+    return []
+
+
+def conditional_page(scopes):
+    """Условный GET: ответ 304, если страница не менялась.
+
+    ETag — хэш версий областей кэша, адреса и пользователя, поэтому он
+    меняется при любом изменении постов ленты. Версия — время записи,
+    которая ее сменила, и Last-Modified — самая новая из версий: его
+    двигает и правка поста, а не только новая публикация. Проверка не
+    выполняет запросов к постам.
+    """
+    def etag(request, *args, **kwargs):
+        if not hasattr(request, '_page_etag'):
+            versions = get_versions([
+                *_view_scopes(request, scopes, args, kwargs),
+                *_viewer_scopes(request),
+            ])
+            request._page_etag = hashlib.md5(
+                _page_key(request, _format_versions(versions)).encode()
+            ).hexdigest()
+            request._page_last_modified = datetime.fromtimestamp(
+                max(version for _, version in versions) / 10 ** 9,
+                timezone.utc,
+            )
+        return request._page_etag
+
+    def last_modified(request, *args, **kwargs):
+        etag(request, *args, **kwargs)
+        return request._page_last_modified
+
+    return condition(etag_func=etag, last_modified_func=last_modified)
+
+
+def index_scopes():
+    return ['index']
+
+
+def group_scopes(slug):
+    return [f'group:{slug}']
+
+
+def profile_scopes(username):
+    return [f'author:{username}']
+
+
+def comments_scopes(post_id):
+    return [f'post:{post_id}']
+
+
+def post_scopes(post_id):
+    username = Post.objects.filter(pk=post_id).values_list(
+        'author__username', flat=True
+    ).first()
+    return [f'post:{post_id}', f'author:{username}']
+
+
+def follow_scopes():
+    # Подписки пользователя учитывает область viewer, которую
+    # conditional_page добавляет сама.
+    return ['index']
+
+
+@receiver(pre_save, sender=Post, dispatch_uid='posts_cache_old_group')
+def remember_old_group(sender, instance, raw=False, **kwargs):
+    instance._old_group_slug = None
+    if instance.pk and not raw:
+        instance._old_group_slug = Post.objects.filter(
+            pk=instance.pk
+        ).values_list('group__slug', flat=True).first()
+
+
+@receiver(post_save, sender=Post, dispatch_uid='posts_cache_post_save')
+@receiver(post_delete, sender=Post, dispatch_uid='posts_cache_post_delete')
+def invalidate_post(sender, instance, **kwargs):
+    scopes = [
+        'index',
+        f'post:{instance.pk}',
+        f'author:{instance.author.username}',
+    ]
+    if instance.group_id:
+        scopes.append(f'group:{instance.group.slug}')
+    old_group_slug = getattr(instance, '_old_group_slug', None)
+    if old_group_slug:
+        scopes.append(f'group:{old_group_slug}')
+    bump_versions(*scopes)
+
+
+def invalidate_image(name):
+    """Сбрасываем страницы постов с картинкой, когда готовы миниатюры."""
+    posts = Post.objects.filter(image=name).select_related('author', 'group')
+    for post in posts:
+        invalidate_post(Post, post)
+
+
+@receiver(post_save, sender=Comment, dispatch_uid='posts_cache_comment_save')
+@receiver(
+    post_delete, sender=Comment, dispatch_uid='posts_cache_comment_delete'
+)
+def invalidate_comment(sender, instance, **kwargs):
+    bump_versions(f'post:{instance.post_id}')
+
+
+@receiver(post_save, sender=Follow, dispatch_uid='posts_cache_follow_save')
+@receiver(post_delete, sender=Follow, dispatch_uid='posts_cache_follow_delete')
+def invalidate_follow(sender, instance, **kwargs):
+    bump_versions(
+        f'author:{instance.author.username}', f'viewer:{instance.user_id}'
+    )
+
+
+@receiver(post_save, sender=Group, dispatch_uid='posts_cache_group_save')
+@receiver(post_delete, sender=Group, dispatch_uid='posts_cache_group_delete')
+def invalidate_group(sender, instance, **kwargs):
+    # Название группы выводится во всех лентах, поэтому сбрасываем все.
+    bump_versions(GLOBAL_SCOPE)
@@ -0,0 +1,136 @@
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Comment, Follow, Post, User, UserCounters
+
+
+def _count_subquery(queryset, field):
+    return Coalesce(Subquery(
+        queryset.filter(**{field: OuterRef('pk')}).order_by().values(
+            field
+        ).annotate(total=Count('pk')).values('total')
+    ), 0)
+
+
+def get_counters(user):
+    """Счетчики пользователя; строку без счетчиков считаем по таблицам.
+
+    Счетчики, выбранные через select_related('counters'), не требуют
+    отдельного запроса.
+    """
+    try:
+        return user.counters
+    except UserCounters.DoesNotExist:
+        pass
+    counters, _ = UserCounters.objects.get_or_create(
+        user=user,
+        defaults={
+            'posts_count': lambda: Post.objects.filter(author=user).count(),
+            'followers_count': (
+                lambda: Follow.objects.filter(author=user).count()
+            ),
+            'following_count': (
+                lambda: Follow.objects.filter(user=user).count()
+            ),
+        }
+    )
+    return counters
+
+
+def recount():
+    """Пересчитываем все счетчики несколькими UPDATE без выборки строк."""
+    UserCounters.objects.bulk_create(
+        (UserCounters(user_id=pk) for pk in User.objects.values_list(
+            'pk', flat=True
+        ).iterator()),
+        ignore_conflicts=True,
+    )
+    counters = UserCounters.objects.update(
+        posts_count=_count_subquery(Post.objects.all(), 'author'),
+        followers_count=_count_subquery(Follow.objects.all(), 'author'),
+        following_count=_count_subquery(Follow.objects.all(), 'user'),
+    )
+    posts = Post.objects.update(
+        comments_count=_count_subquery(Comment.objects.all(), 'post')
+    )
+    return counters, posts
+
+
+def _bump(queryset, field, delta):
+    # Строку счетчиков не создаем: ее пересчитает get_counters или
+    # recount_counters.
+    if delta < 0:
+        queryset = queryset.filter(**{f'{field}__gt': 0})
+    queryset.update(**{field: F(field) + delta})
+
+
+@receiver(post_save, sender=User, dispatch_uid='posts_counters_user_save')
+def create_counters(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        UserCounters.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=Post, dispatch_uid='posts_counters_post_save')
+def count_new_post(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        _bump(
+            UserCounters.objects.filter(user_id=instance.author_id),
+            'posts_count', 1
+        )
+
+
+@receiver(post_delete, sender=Post, dispatch_uid='posts_counters_post_delete')
+def count_deleted_post(sender, instance, **kwargs):
+    _bump(
+        UserCounters.objects.filter(user_id=instance.author_id),
+        'posts_count', -1
+    )
+
+
+@receiver(
+    post_save, sender=Comment, dispatch_uid='posts_counters_comment_save'
+)
+def count_new_comment(sender, instance, created, raw=False, **kwargs):
+    if created and not raw and instance.post_id:
+        _bump(
+            Post.objects.filter(pk=instance.post_id), 'comments_count', 1
+        )
+
+
+@receiver(
+    post_delete, sender=Comment, dispatch_uid='posts_counters_comment_delete'
+)
+def count_deleted_comment(sender, instance, **kwargs):
+    if instance.post_id:
+        _bump(
+            Post.objects.filter(pk=instance.post_id), 'comments_count', -1
+        )
+
+
+@receiver(post_save, sender=Follow, dispatch_uid='posts_counters_follow_save')
+def count_new_follow(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        _bump(
+            UserCounters.objects.filter(user_id=instance.author_id),
+            'followers_count', 1
+        )
+        _bump(
+            UserCounters.objects.filter(user_id=instance.user_id),
+            'following_count', 1
+        )
+
+
+@receiver(
+    post_delete, sender=Follow, dispatch_uid='posts_counters_follow_delete'
+)
+def count_deleted_follow(sender, instance, **kwargs):
+    _bump(
+        UserCounters.objects.filter(user_id=instance.author_id),
+        'followers_count', -1
+    )
+    _bump(
+        UserCounters.objects.filter(user_id=instance.user_id),
+        'following_count', -1
+    )
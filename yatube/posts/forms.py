@@ -1,5 +1,6 @@
 from django import forms
 from .models import Comment, Post
+from .uploads import validate_image_upload
 
 
 class PostForm(forms.ModelForm):
@@ -17,6 +18,26 @@ class PostForm(forms.ModelForm):
             'image': ('Изображение')
         }
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Загрузка проверяется по размеру и заголовку до того, как
+        # ImageField откроет и проверит картинку целиком; отклоненный
+        # файл поле не получает вовсе.
+        self.upload_error = None
+        key = self.add_prefix('image')
+        try:
+            validate_image_upload(self.files.get(key))
+        except forms.ValidationError as error:
+            self.upload_error = error
+            self.files = self.files.copy()
+            self.files.pop(key)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if self.upload_error is not None:
+            self.add_error('image', self.upload_error)
+        return cleaned_data
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
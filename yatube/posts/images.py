@@ -0,0 +1,64 @@
+import os
+import time
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from sorl.thumbnail import delete
+from sorl.thumbnail.images import ImageFile
+
+from .models import Post
+from .storage import image_storage
+
+
+def release_image(name):
+    """Удаляем картинку и ее миниатюры, если на нее не ссылается ни один пост.
+
+    Число ссылок — число постов с этим именем файла, его считает
+    запрос по индексу поля image. Загрузка тех же байтов переиспользует
+    файл и обновляет его время изменения раньше, чем пост попадет в
+    базу, поэтому файл, записанный позже чем за
+    POSTS_IMAGE_RELEASE_GRACE секунд до проверки, не удаляется.
+    """
+    if not name:
+        return False
+    checked_at = time.time()
+    if Post.objects.filter(image=name).exists():
+        return False
+    try:
+        modified = os.path.getmtime(image_storage.path(name))
+    except SuspiciousFileOperation:
+        # Путь вне MEDIA_ROOT хранилищу не принадлежит.
+        return False
+    except FileNotFoundError:
+        modified = None
+    grace = settings.POSTS_IMAGE_RELEASE_GRACE
+    if modified is not None and modified > checked_at - grace:
+        return False
+    delete(ImageFile(name, image_storage))
+    return True
+
+
+@receiver(pre_save, sender=Post, dispatch_uid='posts_images_old_image')
+def remember_old_image(sender, instance, raw=False, **kwargs):
+    instance._old_image = None
+    if instance.pk and not raw:
+        instance._old_image = Post.objects.filter(
+            pk=instance.pk
+        ).values_list('image', flat=True).first()
+
+
+@receiver(post_save, sender=Post, dispatch_uid='posts_images_post_save')
+def release_replaced_image(sender, instance, **kwargs):
+    old_image = getattr(instance, '_old_image', None)
+    if old_image and old_image != instance.image.name:
+        transaction.on_commit(lambda: release_image(old_image))
+
+
+@receiver(post_delete, sender=Post, dispatch_uid='posts_images_post_delete')
+def release_deleted_image(sender, instance, **kwargs):
+    name = instance.image.name
+    if name:
+        transaction.on_commit(lambda: release_image(name))
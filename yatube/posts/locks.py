@@ -0,0 +1,106 @@
+import hashlib
+import os
+import threading
+import uuid
+from contextlib import contextmanager
+
+from django.core.cache import cache, caches
+from django.core.cache.backends.filebased import FileBasedCache
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - не POSIX
+    fcntl = None
+
+
+_in_flight = set()
+_in_flight_guard = threading.Lock()
+
+
+@contextmanager
+def _process_lock(key):
+    """Блокировка между потоками процесса без ожидания."""
+    with _in_flight_guard:
+        if key in _in_flight:
+            acquired = False
+        else:
+            _in_flight.add(key)
+            acquired = True
+    if not acquired:
+        yield False
+        return
+    try:
+        yield True
+    finally:
+        with _in_flight_guard:
+            _in_flight.discard(key)
+
+
+@contextmanager
+def _file_lock(backend, key):
+    """Межпроцессная блокировка через flock в каталоге файлового кэша.
+
+    Ключ страницы включает версии и пользователя, поэтому лидер удаляет
+    файл блокировки, пока держит его: clear() и отсев кэша видят только
+    *.djcache. Кто успел открыть удаленный файл, захватит его, но по
+    другому inode поймет, что блокировка уже не действует.
+    """
+    lock_dir = os.path.join(backend._dir, 'locks')
+    os.makedirs(lock_dir, exist_ok=True)
+    path = os.path.join(lock_dir, hashlib.md5(key.encode()).hexdigest())
+    path += '.lock'
+    with open(path, 'a') as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            yield False
+            return
+        try:
+            current = os.stat(path).st_ino
+        except FileNotFoundError:
+            current = None
+        if current != os.fstat(lock_file.fileno()).st_ino:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            os.unlink(path)
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+@contextmanager
+def _cache_lock(key, timeout):
+    """Межпроцессная блокировка через атомарный cache.add."""
+    lock_key = f'posts:lock:{key}'
+    token = uuid.uuid4().hex
+    if not cache.add(lock_key, token, timeout):
+        yield False
+        return
+    try:
+        yield True
+    finally:
+        if cache.get(lock_key) == token:
+            cache.delete(lock_key)
+
+
+@contextmanager
+def single_flight(key, timeout):
+    """Пускаем пересчитывать значение только одного исполнителя.
+
+    Внутри процесса ключи в работе хранятся в множестве, между процессами —
+    flock для файлового кэша или cache.add для остальных бэкендов.
+    Возвращает True лидеру и False всем, кто пришел во время пересчета.
+    """
+    with _process_lock(key) as acquired:
+        if not acquired:
+            yield False
+            return
+        backend = caches['default']
+        if isinstance(backend, FileBasedCache) and fcntl is not None:
+            shared_lock = _file_lock(backend, key)
+        else:
+            shared_lock = _cache_lock(key, timeout)
+        with shared_lock as acquired:
+            yield acquired
@@ -0,0 +1,37 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from posts.transfer import (
+    FORMATS, Progress, export_rows, guess_format, write_rows
+)
+
+
+class Command(BaseCommand):
+    help = 'Выгружает посты потоком в NDJSON или CSV.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?', default='-',
+            help='Файл выгрузки; «-» — стандартный вывод.'
+        )
+        parser.add_argument('--format', choices=FORMATS)
+        parser.add_argument(
+            '--chunk-size', type=int, default=2000,
+            help='Сколько строк читать из базы за раз.'
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or guess_format(path)
+        progress = Progress(self.stderr.write)
+        rows = export_rows(chunk_size=options['chunk_size'])
+        if path == '-':
+            write_rows(rows, sys.stdout, fmt, progress)
+        else:
+            with open(path, 'w', encoding='utf-8', newline='') as stream:
+                write_rows(rows, stream, fmt, progress)
+        self.stderr.write(self.style.SUCCESS(
+            f'Выгружено постов: {progress.rows}, '
+            f'{progress.rate:.0f} строк/с'
+        ))
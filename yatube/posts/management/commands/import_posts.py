@@ -0,0 +1,50 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from posts.transfer import FORMATS, PostImporter, guess_format, read_rows
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает посты из NDJSON или CSV пачками bulk_create; '
+        'авторы и группы ищутся по username и slug.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', help='Файл выгрузки; «-» — стандартный ввод.'
+        )
+        parser.add_argument('--format', choices=FORMATS)
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Строк в одном bulk_create.'
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=20000,
+            help='Строк в одной транзакции.'
+        )
+        parser.add_argument(
+            '--create-missing', action='store_true',
+            help='Создавать неизвестных авторов и группы.'
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or guess_format(path)
+        importer = PostImporter(
+            batch_size=options['batch_size'],
+            chunk_size=options['chunk_size'],
+            create_missing=options['create_missing'],
+            log=self.stdout.write,
+        )
+        if path == '-':
+            progress = importer.run(read_rows(sys.stdin, fmt))
+        else:
+            with open(path, encoding='utf-8', newline='') as stream:
+                progress = importer.run(read_rows(stream, fmt))
+        self.stdout.write(self.style.SUCCESS(
+            f'Загружено постов: {progress.rows}, '
+            f'пропущено строк: {importer.skipped}, '
+            f'{progress.rate:.0f} строк/с'
+        ))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from posts.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Заново строит полнотекстовый индекс постов и его триггеры.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--database', default=DEFAULT_DB_ALIAS,
+            help='База данных, в которой строится индекс.',
+        )
+
+    def handle(self, *args, **options):
+        if not rebuild_index(options['database']):
+            raise CommandError('Полнотекстовый поиск доступен только в SQLite')
+        self.stdout.write(self.style.SUCCESS('Поисковый индекс перестроен'))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from posts.counters import recount
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счетчики постов, комментариев и подписок.'
+
+    def handle(self, *args, **options):
+        counters, posts = recount()
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчитано пользователей: {counters}, постов: {posts}'
+        ))
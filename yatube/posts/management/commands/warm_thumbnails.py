@@ -0,0 +1,41 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from posts.caching import GLOBAL_SCOPE, bump_versions
+from posts.models import Post
+from posts.thumbnails import generate_thumbnails
+
+
+class Command(BaseCommand):
+    help = 'Заранее создает миниатюры для всех картинок постов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=4,
+            help='Число потоков, создающих миниатюры; 1 — без пула.'
+        )
+
+    def handle(self, *args, **options):
+        names = Post.objects.exclude(image='').order_by().values_list(
+            'image', flat=True
+        ).distinct().iterator()
+        if options['workers'] > 1:
+            with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+                done = sum(pool.map(self.generate, names))
+        else:
+            done = sum(map(generate_thumbnails, names))
+        if done:
+            # Страницы с заглушками вместо миниатюр больше не нужны.
+            bump_versions(GLOBAL_SCOPE)
+        self.stdout.write(self.style.SUCCESS(
+            f'Созданы миниатюры для картинок: {done}'
+        ))
+
+    @staticmethod
+    def generate(name):
+        try:
+            return generate_thumbnails(name)
+        finally:
+            close_old_connections()
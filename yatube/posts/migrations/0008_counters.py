@@ -0,0 +1,64 @@
+# Generated by Django 2.2.16 on 2026-10-17 06:29
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.db.models.functions
+
+
+def count_subquery(model, field):
+    rows = model.objects.filter(
+        **{field: models.OuterRef('pk')}
+    ).order_by().values(field).annotate(
+        total=models.Count('pk')
+    ).values('total')
+    return models.functions.Coalesce(models.Subquery(rows), 0)
+
+
+def fill_counters(apps, schema_editor):
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    Comment = apps.get_model('posts', 'Comment')
+    Follow = apps.get_model('posts', 'Follow')
+    Post = apps.get_model('posts', 'Post')
+    UserCounters = apps.get_model('posts', 'UserCounters')
+    UserCounters.objects.bulk_create(
+        (UserCounters(user_id=pk) for pk in User.objects.values_list(
+            'pk', flat=True
+        ).iterator()),
+    )
+    UserCounters.objects.update(
+        posts_count=count_subquery(Post, 'author'),
+        followers_count=count_subquery(Follow, 'author'),
+        following_count=count_subquery(Follow, 'user'),
+    )
+    Post.objects.update(comments_count=count_subquery(Comment, 'post'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0011_update_proxy_permissions'),
+        ('posts', '0007_timelineentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserCounters',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='counters', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+                ('posts_count', models.PositiveIntegerField(default=0, verbose_name='Число постов')),
+                ('followers_count', models.PositiveIntegerField(default=0, verbose_name='Число подписчиков')),
+                ('following_count', models.PositiveIntegerField(default=0, verbose_name='Число подписок')),
+            ],
+            options={
+                'verbose_name': 'Счетчики пользователя',
+                'verbose_name_plural': 'Счетчики пользователей',
+            },
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='comments_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Число комментариев'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,63 @@
+from django.db import migrations
+
+# SQL скопирован из posts.search на момент миграции: изменения модуля
+# не должны менять уже примененную миграцию.
+INSTALL_SQL = (
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS posts_post_fts USING fts5(
+        text, content='posts_post', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS posts_post_fts_ai AFTER INSERT ON posts_post
+    BEGIN
+        INSERT INTO posts_post_fts(rowid, text) VALUES (new.id, new.text);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS posts_post_fts_ad AFTER DELETE ON posts_post
+    BEGIN
+        INSERT INTO posts_post_fts(posts_post_fts, rowid, text)
+        VALUES ('delete', old.id, old.text);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS posts_post_fts_au
+    AFTER UPDATE OF text ON posts_post
+    BEGIN
+        INSERT INTO posts_post_fts(posts_post_fts, rowid, text)
+        VALUES ('delete', old.id, old.text);
+        INSERT INTO posts_post_fts(rowid, text) VALUES (new.id, new.text);
+    END
+    """,
+    "INSERT INTO posts_post_fts(posts_post_fts) VALUES ('rebuild')",
+)
+
+DROP_SQL = (
+    'DROP TRIGGER IF EXISTS posts_post_fts_ai',
+    'DROP TRIGGER IF EXISTS posts_post_fts_ad',
+    'DROP TRIGGER IF EXISTS posts_post_fts_au',
+    'DROP TABLE IF EXISTS posts_post_fts',
+)
+
+
+def run_sqlite(statements):
+    # FTS5 есть только в SQLite, на других базах поиск не подключается.
+    def operation(apps, schema_editor):
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0010_comment_feed_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(run_sqlite(INSTALL_SQL), run_sqlite(DROP_SQL)),
+    ]
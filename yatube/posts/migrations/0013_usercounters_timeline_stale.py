@@ -0,0 +1,29 @@
+# Generated by Django 2.2.16 on 2026-10-17 07:53
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def mark_popular_authors(apps, schema_editor):
+    # Посты популярных авторов могли не попасть в ленты до появления
+    # флага.
+    UserCounters = apps.get_model('posts', 'UserCounters')
+    UserCounters.objects.filter(
+        followers_count__gte=settings.TIMELINE_FANOUT_LIMIT
+    ).update(timeline_stale=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0012_post_image_content_addressed'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usercounters',
+            name='timeline_stale',
+            field=models.BooleanField(default=False, verbose_name='Ленты подписчиков неполные'),
+        ),
+        migrations.RunPython(mark_popular_authors, migrations.RunPython.noop),
+    ]
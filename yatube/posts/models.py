@@ -1,6 +1,8 @@
 from django.db import models
 from django.contrib.auth import get_user_model
 
+from .storage import image_storage
+
 User = get_user_model()
 
 
@@ -53,11 +55,32 @@ class Post(models.Model):
     image = models.ImageField(
         verbose_name='Картинка',
         upload_to='posts/',
-        blank=True
+        storage=image_storage,
+        blank=True,
+        db_index=True
+    )
+    comments_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Число комментариев'
     )
 
     class Meta:
-        ordering = ('-pub_date',)
+        ordering = ('-pub_date', '-id')
+        indexes = [
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='post_author_pub_date_idx'
+            ),
+            models.Index(
+                fields=['group', '-pub_date', '-id'],
+                name='post_group_pub_date_idx'
+            ),
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='post_pub_date_id_idx'
+            ),
+        ]
         verbose_name_plural = 'Посты'
 
     def __str__(self):
@@ -90,7 +113,13 @@ class Comment(models.Model):
     )
 
     class Meta:
-        ordering = ('-pub_date',)
+        ordering = ('-pub_date', '-id')
+        indexes = [
+            models.Index(
+                fields=['post', '-pub_date', '-id'],
+                name='comment_post_feed_idx'
+            ),
+        ]
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
 
@@ -114,5 +143,81 @@ class Follow(models.Model):
                 name='unique_user_author'
             )
         ]
+        # Индекс (user, author) создает ограничение unique_user_author.
+        indexes = [
+            models.Index(
+                fields=['author', 'user'],
+                name='follow_author_user_idx'
+            ),
+        ]
         verbose_name = 'Подписка'
         verbose_name_plural = 'Подписки'
+
+
+class TimelineEntry(models.Model):
+    """Материализованная лента подписок: пост, разложенный подписчику."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Подписчик'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Пост'
+    )
+    pub_date = models.DateTimeField(
+        verbose_name='Дата публикации'
+    )
+
+    class Meta:
+        ordering = ('-pub_date',)
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                name='unique_timeline_user_post'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='timeline_user_feed_idx'
+            )
+        ]
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+
+
+class UserCounters(models.Model):
+    """Денормализованные счетчики автора, поддерживаются сигналами."""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='counters',
+        verbose_name='Пользователь'
+    )
+    posts_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Число постов'
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Число подписчиков'
+    )
+    following_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Число подписок'
+    )
+    # Посты автора не разложены в часть лент: он был популярным, когда
+    # писал их или когда на него подписывались.
+    timeline_stale = models.BooleanField(
+        default=False,
+        verbose_name='Ленты подписчиков неполные'
+    )
+
+    class Meta:
+        verbose_name = 'Счетчики пользователя'
+        verbose_name_plural = 'Счетчики пользователей'
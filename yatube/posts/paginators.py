@@ -0,0 +1,250 @@
+import base64
+import binascii
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import (EmptyPage, Page, PageNotAnInteger,
+                                   Paginator)
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+
+
+CURSOR_SEPARATOR = '|'
+
+
+def encode_cursor(obj, key=('pub_date', 'id')):
+    """Кодируем ключ (дата, id) объекта или строки values() в токен."""
+    date_field, id_field = key
+    if isinstance(obj, dict):
+        pub_date, pk = obj[date_field], obj[id_field]
+    else:
+        pub_date, pk = getattr(obj, date_field), getattr(obj, id_field)
+    raw = f'{pub_date.isoformat()}{CURSOR_SEPARATOR}{pk}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Разбираем токен обратно в (pub_date, id) или возвращаем None."""
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        pub_date, pk = raw.rsplit(CURSOR_SEPARATOR, 1)
+        pub_date = parse_datetime(pub_date)
+        pk = int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+    if pub_date is None:
+        return None
+    return pub_date, pk
+
+
+class CursorPage(Page):
+    """Страница курсорной пагинации.
+
+    Номер страницы и общее число страниц неизвестны, вместо них
+    шаблон получает токены соседних страниц.
+    """
+    is_cursor = True
+
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        super().__init__(object_list, None, paginator)
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def next_cursor(self):
+        if not self._has_next:
+            return None
+        return encode_cursor(self.object_list[-1], self.paginator.key)
+
+    def previous_cursor(self):
+        if not self._has_previous:
+            return None
+        return encode_cursor(self.object_list[0], self.paginator.key)
+
+    def __repr__(self):
+        return '<Cursor page>'
+
+
+class CursorPaginator(Paginator):
+    """Пагинатор по ключу (pub_date, id) в порядке Post.Meta.ordering.
+
+    Каждая страница выбирается одним запросом
+    WHERE (pub_date, id) < курсор LIMIT per_page + 1, без COUNT(*)
+    и OFFSET, поэтому любая страница стоит столько же, сколько первая.
+    Ключом может быть и пара аннотаций, например даты из ленты подписок.
+    """
+
+    def __init__(self, object_list, per_page, key=('pub_date', 'id'),
+                 **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.key = key
+
+    def _seek(self, queryset, cursor, lookup):
+        date_field, id_field = self.key
+        pub_date, pk = cursor
+        return queryset.filter(
+            Q(**{f'{date_field}__{lookup}': pub_date})
+            | Q(**{date_field: pub_date, f'{id_field}__{lookup}': pk})
+        )
+
+    def get_cursor_page(self, after=None, before=None):
+        """Возвращаем страницу после/до токена, при ошибке — первую."""
+        after = decode_cursor(after)
+        before = decode_cursor(before) if after is None else None
+        date_field, id_field = self.key
+        queryset = self.object_list
+        limit = self.per_page + 1
+        if before is not None:
+            rows = list(self._seek(queryset, before, 'gt').order_by(
+                date_field, id_field
+            )[:limit])
+            if not rows:
+                return self.get_cursor_page()
+            has_previous = len(rows) > self.per_page
+            rows = rows[:self.per_page]
+            rows.reverse()
+            return CursorPage(rows, self, True, has_previous)
+        if after is not None:
+            queryset = self._seek(queryset, after, 'lt')
+        rows = list(queryset.order_by(
+            f'-{date_field}', f'-{id_field}'
+        )[:limit])
+        has_next = len(rows) > self.per_page
+        return CursorPage(
+            rows[:self.per_page], self, has_next, after is not None
+        )
+
+
+class CachedCountPaginator(Paginator):
+    """Пагинатор, который берет число объектов из кэша.
+
+    COUNT(*) выполняется раз в POSTS_COUNT_CACHE_TIMEOUT секунд на ленту,
+    либо не выполняется вовсе, если передан готовый счетчик. Ключ числа
+    включает версии областей кэша ленты, поэтому новые посты и подписки
+    сразу его сбрасывают. Подсчет останавливается на
+    POSTS_EXACT_COUNT_LIMIT, и дальше шаблон выводит «много» вместо
+    номеров. Страницы выбираются с одной лишней строкой, и по ним
+    устаревшее число поправляется: ссылка на следующую страницу не
+    пропадает, а последняя страница дает точное число без COUNT(*).
+    """
+    ELLIPSIS = '…'
+
+    def __init__(self, object_list, per_page, count_key=None, count=None,
+                 **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.count_key = count_key
+        self._known_count = count
+        self._min_count = 0
+
+    def _count(self):
+        # Подсчет первых LIMIT + 1 строк не сканирует всю ленту, а без
+        # сортировки и аннотаций не строит временный индекс.
+        limit = settings.POSTS_EXACT_COUNT_LIMIT + 1
+        return self.object_list.order_by().values('pk')[:limit].count()
+
+    def _cached_count(self):
+        if self._known_count is not None:
+            return self._known_count
+        if self.count_key is None:
+            return self._count()
+        key = f'posts:count:{self.count_key}'
+        count = cache.get(key)
+        if count is None:
+            count = self._count()
+            cache.set(key, count, settings.POSTS_COUNT_CACHE_TIMEOUT)
+        return count
+
+    @cached_property
+    def count(self):
+        return max(self._cached_count(), self._min_count)
+
+    def _correct_count(self, bottom, rows):
+        """Поправляем число по строкам, выбранным для страницы."""
+        if len(rows) > self.per_page:
+            self._min_count = max(self._min_count, bottom + len(rows))
+            if 'count' in self.__dict__:
+                self.__dict__['count'] = max(self.count, self._min_count)
+        else:
+            self.__dict__['count'] = bottom + len(rows)
+        self.__dict__.pop('num_pages', None)
+
+    @property
+    def is_approximate(self):
+        return self.count > settings.POSTS_EXACT_COUNT_LIMIT
+
+    def validate_number(self, number):
+        """Номер страницы без проверки по числу объектов.
+
+        Число может быть приблизительным или устаревшим, поэтому пустоту
+        страницы проверяет page() по выбранным строкам.
+        """
+        try:
+            if isinstance(number, float) and not number.is_integer():
+                raise ValueError
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger('That page number is not an integer')
+        if number < 1:
+            raise EmptyPage('That page number is less than 1')
+        return number
+
+    def page(self, number):
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        rows = list(self.object_list[bottom:bottom + self.per_page + 1])
+        if not rows and number > 1:
+            raise EmptyPage('That page contains no results')
+        self._correct_count(bottom, rows)
+        return self._get_page(rows[:self.per_page], number, self)
+
+    def get_page(self, number):
+        """Страница по номеру; вместо несуществующей — последняя."""
+        try:
+            return self.page(number)
+        except PageNotAnInteger:
+            return self.page(1)
+        except EmptyPage:
+            pass
+        try:
+            return self.page(self.num_pages)
+        except EmptyPage:
+            return self.page(1)
+
+    def get_elided_page_range(self, number=1, *, on_each_side=2, on_ends=1):
+        """Номера страниц для ссылок: края и соседи текущей через «…».
+
+        Повторяет Paginator.get_elided_page_range из Django 3.2; число
+        ссылок не зависит от числа страниц. Для приблизительного числа
+        последние страницы не выводятся.
+        """
+        number = self.validate_number(number)
+        num_pages = self.num_pages
+        window = (on_each_side + on_ends) * 2
+        if num_pages <= window and not self.is_approximate:
+            yield from self.page_range
+            return
+        if number > (1 + on_each_side + on_ends) + 1:
+            yield from range(1, on_ends + 1)
+            yield self.ELLIPSIS
+            yield from range(number - on_each_side, number + 1)
+        else:
+            yield from range(1, number + 1)
+        if self.is_approximate:
+            yield from range(
+                number + 1, min(number + on_each_side, num_pages) + 1
+            )
+        elif number < (num_pages - on_each_side - on_ends) - 1:
+            yield from range(number + 1, number + on_each_side + 1)
+            yield self.ELLIPSIS
+            yield from range(num_pages - on_ends + 1, num_pages + 1)
+        else:
+            yield from range(number + 1, num_pages + 1)
@@ -0,0 +1,220 @@
+import base64
+import binascii
+import re
+
+from django.core.paginator import Paginator
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models.expressions import RawSQL
+from django.db.models.signals import post_migrate
+from django.dispatch import receiver
+
+from .paginators import CURSOR_SEPARATOR, CursorPage
+
+
+FTS_TABLE = 'posts_post_fts'
+# Больше слов в запросе не нужно, а длинный запрос дорого разбирать.
+MAX_TERMS = 16
+
+INSTALL_SQL = (
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        text, content='posts_post', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON posts_post
+    BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, text) VALUES (new.id, new.text);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON posts_post
+    BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text)
+        VALUES ('delete', old.id, old.text);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au
+    AFTER UPDATE OF text ON posts_post
+    BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text)
+        VALUES ('delete', old.id, old.text);
+        INSERT INTO {FTS_TABLE}(rowid, text) VALUES (new.id, new.text);
+    END
+    """,
+)
+
+DROP_SQL = (
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_ai',
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_ad',
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_au',
+    f'DROP TABLE IF EXISTS {FTS_TABLE}',
+)
+
+
+def is_supported(using=DEFAULT_DB_ALIAS):
+    return connections[using].vendor == 'sqlite'
+
+
+def install_index(using=DEFAULT_DB_ALIAS):
+    """Создаем таблицу FTS5 и триггеры синхронизации, если их нет."""
+    if not is_supported(using):
+        return False
+    with connections[using].cursor() as cursor:
+        for statement in INSTALL_SQL:
+            cursor.execute(statement)
+    return True
+
+
+def drop_index(using=DEFAULT_DB_ALIAS):
+    if not is_supported(using):
+        return
+    with connections[using].cursor() as cursor:
+        for statement in DROP_SQL:
+            cursor.execute(statement)
+
+
+def rebuild_index(using=DEFAULT_DB_ALIAS):
+    """Заново строим индекс по всем постам."""
+    if not install_index(using):
+        return False
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"
+        )
+    return True
+
+
+def build_match_query(text):
+    """Превращаем ввод пользователя в запрос FTS5 без операторов.
+
+    Каждое слово берется в кавычки, поэтому кавычки, звездочки и
+    NEAR из ввода не ломают синтаксис, а слова объединяются через AND.
+    """
+    terms = re.findall(r'\w+', text or '')[:MAX_TERMS]
+    return ' '.join(f'"{term}"' for term in terms)
+
+
+def matching_ids(text):
+    """Подзапрос с id постов, подходящих под запрос, для pk__in."""
+    return RawSQL(
+        f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s',
+        (build_match_query(text),),
+    )
+
+
+def encode_rank_cursor(post):
+    raw = f'{post.search_rank!r}{CURSOR_SEPARATOR}{post.pk}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_rank_cursor(token):
+    """Разбираем токен в (rank, id) или возвращаем None."""
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        rank, pk = raw.rsplit(CURSOR_SEPARATOR, 1)
+        return float(rank), int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+
+
+class SearchPage(CursorPage):
+    """Страница выдачи, токены соседних страниц хранят (rank, id)."""
+
+    def next_cursor(self):
+        if not self._has_next:
+            return None
+        return encode_rank_cursor(self.object_list[-1])
+
+    def previous_cursor(self):
+        if not self._has_previous:
+            return None
+        return encode_rank_cursor(self.object_list[0])
+
+
+class SearchPaginator(Paginator):
+    """Ранжированная выдача FTS5 с пагинацией по ключу (rank, id).
+
+    Страница выбирается из индекса одним запросом
+    WHERE MATCH AND (rank, id) после курсора LIMIT per_page + 1,
+    без OFFSET и COUNT(*): стоимость зависит от числа совпадений,
+    а не от размера таблицы постов. Посты подгружаются вторым
+    запросом по первичному ключу.
+    """
+
+    def __init__(self, object_list, per_page, query, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.match = build_match_query(query)
+
+    def _ranked_ids(self, cursor, backwards, limit):
+        sql = (
+            f'SELECT rowid, rank FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s'
+        )
+        params = [self.match]
+        if cursor is not None:
+            rank, pk = cursor
+            if backwards:
+                sql += ' AND (rank < %s OR (rank = %s AND rowid > %s))'
+            else:
+                sql += ' AND (rank > %s OR (rank = %s AND rowid < %s))'
+            params += [rank, rank, pk]
+        if backwards:
+            sql += ' ORDER BY rank DESC, rowid ASC'
+        else:
+            sql += ' ORDER BY rank, rowid DESC'
+        sql += ' LIMIT %s'
+        params.append(limit)
+        with connections[self.object_list.db].cursor() as db_cursor:
+            db_cursor.execute(sql, params)
+            return db_cursor.fetchall()
+
+    def _load(self, rows):
+        posts = self.object_list.in_bulk([pk for pk, _ in rows])
+        result = []
+        for pk, rank in rows:
+            post = posts.get(pk)
+            if post is not None:
+                post.search_rank = rank
+                result.append(post)
+        return result
+
+    def get_cursor_page(self, after=None, before=None):
+        """Возвращаем страницу после/до токена, при ошибке — первую."""
+        if not self.match:
+            return SearchPage([], self, False, False)
+        after = decode_rank_cursor(after)
+        before = decode_rank_cursor(before) if after is None else None
+        limit = self.per_page + 1
+        if before is not None:
+            rows = self._ranked_ids(before, True, limit)
+            if not rows:
+                return self.get_cursor_page()
+            has_previous = len(rows) > self.per_page
+            rows = rows[:self.per_page]
+            rows.reverse()
+            return SearchPage(self._load(rows), self, True, has_previous)
+        rows = self._ranked_ids(after, False, limit)
+        has_next = len(rows) > self.per_page
+        return SearchPage(
+            self._load(rows[:self.per_page]), self, has_next,
+            after is not None,
+        )
+
+
+@receiver(post_migrate, dispatch_uid='posts_search_install')
+def reinstall_triggers(sender, using=DEFAULT_DB_ALIAS, **kwargs):
+    # SQLite пересоздает таблицу при изменении полей и теряет триггеры,
+    # поэтому после каждой миграции восстанавливаем их.
+    if sender.name != 'posts' or not is_supported(using):
+        return
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        tables = connection.introspection.table_names(cursor)
+    if FTS_TABLE in tables:
+        install_index(using)
@@ -0,0 +1,62 @@
+import hashlib
+import os
+import posixpath
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранилище, в котором имя файла — хэш его содержимого.
+
+    Загрузка пишется во временный файл, а SHA-256 считается по тем же
+    кускам, поэтому файл читается один раз. Файл кладется в
+    <каталог>/<первые два знака хэша>/<хэш><расширение>; если такой
+    уже есть, новая копия отбрасывается и возвращается имя старой.
+    Одинаковые картинки хранятся и уменьшаются однажды.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # Окончательное имя задает содержимое в _save(), а совпадение
+        # имени означает тот же файл.
+        return name
+
+    def _save(self, name, content):
+        directory = posixpath.dirname(name)
+        extension = posixpath.splitext(name)[1].lower()
+        os.makedirs(self.path(directory), exist_ok=True)
+        descriptor, temp_path = tempfile.mkstemp(
+            dir=self.path(directory), suffix='.upload'
+        )
+        digest = hashlib.sha256()
+        try:
+            with os.fdopen(descriptor, 'wb') as temp_file:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    temp_file.write(chunk)
+            hexdigest = digest.hexdigest()
+            name = posixpath.join(
+                directory, hexdigest[:2], hexdigest + extension
+            )
+            path = self.path(name)
+            if os.path.exists(path):
+                os.remove(temp_path)
+                # Свежее время изменения не дает release_image удалить
+                # файл, пока пост с ним еще не сохранен.
+                os.utime(path)
+                return name
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.chmod(temp_path, self.file_permissions_mode or 0o644)
+            # Переименование атомарно: параллельная загрузка того же
+            # файла заменит его идентичной копией.
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return name
+
+
+image_storage = ContentAddressedStorage()
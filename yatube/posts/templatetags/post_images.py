@@ -0,0 +1,41 @@
+from django import template
+from sorl.thumbnail import get_thumbnail
+
+from posts.thumbnails import (PlaceholderImageFile, image_formats,
+                              thumbnail_variants)
+
+register = template.Library()
+
+MIME_TYPES = {'WEBP': 'image/webp', 'JPEG': 'image/jpeg'}
+
+
+@register.inclusion_tag('includes/post_image.html')
+def post_image(image, size):
+    """Картинка поста: srcset из готовых копий, WebP с запасным JPEG.
+
+    Пока копии не созданы, выводится заглушка тех же размеров.
+    Ширина и высота задают место под картинку до ее загрузки.
+    """
+    if not image:
+        return {}
+    sources = []
+    for image_format in image_formats():
+        variants = list(thumbnail_variants(size, image_format))
+        thumbnails = []
+        for geometry, options in variants:
+            im = get_thumbnail(image, geometry, **options)
+            if isinstance(im, PlaceholderImageFile):
+                return {'image': PlaceholderImageFile(variants[-1][0])}
+            thumbnails.append(im)
+        sources.append({
+            'type': MIME_TYPES[image_format],
+            'srcset': ', '.join(f'{im.url} {im.width}w' for im in thumbnails),
+        })
+    *modern, fallback = sources
+    largest = thumbnails[-1]
+    return {
+        'image': largest,
+        'sources': modern,
+        'srcset': fallback['srcset'],
+        'sizes': f'(max-width: {largest.width}px) 100vw, {largest.width}px',
+    }
@@ -0,0 +1,112 @@
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+from posts.models import Group, Post, User
+from posts.storage import image_storage
+
+
+class ApiTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Author')
+        cls.reader = User.objects.create_user(username='Reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        cls.posts = [
+            Post.objects.create(
+                author=cls.author, group=cls.group, text=f'Пост {i}'
+            )
+            for i in range(25)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.reader_client = Client()
+        self.reader_client.force_login(ApiTest.reader)
+
+    def test_feeds_paginated_by_cursor(self):
+        """Ленты отдают посты страницами по курсору."""
+        for url in (
+            reverse('api:index'),
+            reverse('api:group_list', args=['group']),
+            reverse('api:profile', args=['Author']),
+        ):
+            with self.subTest(url=url):
+                first = self.guest_client.get(url).json()
+                self.assertEqual(len(first['results']), 20)
+                self.assertEqual(first['results'][0], {
+                    'id': ApiTest.posts[-1].pk,
+                    'author': 'Author',
+                    'group': 'group',
+                    'text': 'Пост 24',
+                    'pub_date': ApiTest.posts[-1].pub_date.isoformat(),
+                    'image': None,
+                })
+                self.assertIsNone(first['previous'])
+                second = self.guest_client.get(first['next']).json()
+                self.assertEqual(len(second['results']), 5)
+                self.assertIsNone(second['next'])
+                back = self.guest_client.get(second['previous']).json()
+                self.assertEqual(back['results'], first['results'])
+
+    def test_post_detail_and_missing(self):
+        """Пост отдается по id, несуществующие объекты — 404."""
+        post = ApiTest.posts[0]
+        response = self.guest_client.get(
+            reverse('api:post_detail', args=[post.pk])
+        )
+        self.assertEqual(response.json()['text'], post.text)
+        name = 'posts/ab/abcdef.gif'
+        Post.objects.filter(pk=post.pk).update(image=name)
+        cache.clear()
+        response = self.guest_client.get(
+            reverse('api:post_detail', args=[post.pk])
+        )
+        self.assertEqual(response.json()['image'], image_storage.url(name))
+        for url in (
+            reverse('api:post_detail', args=[0]),
+            reverse('api:group_list', args=['missing']),
+            reverse('api:profile', args=['Nobody']),
+        ):
+            with self.subTest(url=url):
+                self.assertEqual(self.guest_client.get(url).status_code, 404)
+
+    def test_follow_feed(self):
+        """Лента подписок требует входа и меняет ETag при подписке."""
+        url = reverse('api:follow_index')
+        self.assertEqual(self.guest_client.get(url).status_code, 401)
+        response = self.reader_client.get(url)
+        self.assertEqual(response.json()['results'], [])
+        self.reader_client.get(
+            reverse('posts:profile_follow', args=['Author'])
+        )
+        followed = self.reader_client.get(
+            url, HTTP_IF_NONE_MATCH=response['ETag']
+        )
+        self.assertEqual(followed.status_code, 200)
+        self.assertEqual(len(followed.json()['results']), 20)
+
+    def test_conditional_get(self):
+        """Без изменений ответ 304, после нового поста — 200."""
+        url = reverse('api:index')
+        response = self.guest_client.get(url)
+        self.assertEqual(
+            response['Last-Modified'],
+            self.guest_client.get(url)['Last-Modified'],
+        )
+        etag = response['ETag']
+        self.assertTrue(etag.startswith('"'))
+        not_modified = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified.content, b'')
+        since = self.guest_client.get(
+            url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']
+        )
+        self.assertEqual(since.status_code, 304)
+        Post.objects.create(author=ApiTest.author, text='Новый пост')
+        changed = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], etag)
@@ -0,0 +1,132 @@
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+from unittest import mock, skipIf
+
+from django.core.cache import cache
+from django.core.cache.backends.filebased import FileBasedCache
+from django.test import Client, TestCase
+from django.urls import reverse
+from posts import caching
+from posts.locks import _file_lock, fcntl, single_flight
+from posts.models import Comment, Post, User
+
+
+class PageCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Cached')
+        cls.post = Post.objects.create(author=cls.user, text='Первый пост')
+
+    def setUp(self):
+        self.guest_client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(PageCacheTest.user)
+        cache.clear()
+
+    def test_single_flight_lets_one_leader(self):
+        """Пока ключ занят, второй исполнитель не становится лидером."""
+        with single_flight('key', 10) as leader:
+            self.assertTrue(leader)
+            with single_flight('key', 10) as follower:
+                self.assertFalse(follower)
+            with single_flight('other-key', 10) as other:
+                self.assertTrue(other)
+        with single_flight('key', 10) as leader:
+            self.assertTrue(leader)
+
+    @skipIf(fcntl is None, 'flock есть только в POSIX')
+    def test_file_lock_removed_after_release(self):
+        """Файлы блокировок файлового кэша не копятся."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        backend = FileBasedCache(directory, {})
+        with _file_lock(backend, 'key') as leader:
+            self.assertTrue(leader)
+            with _file_lock(backend, 'key') as follower:
+                self.assertFalse(follower)
+        self.assertEqual(os.listdir(os.path.join(directory, 'locks')), [])
+        with _file_lock(backend, 'key') as leader:
+            self.assertTrue(leader)
+
+    def test_stale_page_served_while_recomputing(self):
+        """Во время пересчета страницы отдаем прошлую копию."""
+        url = reverse('posts:index')
+        self.guest_client.get(url)
+        Post.objects.create(author=PageCacheTest.user, text='Новый пост')
+        with mock.patch('posts.caching.single_flight', _busy_lock):
+            response = self.guest_client.get(url)
+        self.assertNotContains(response, 'Новый пост')
+        response = self.guest_client.get(url)
+        self.assertContains(response, 'Новый пост')
+
+    def test_stale_page_keeps_its_validators(self):
+        """Прошлая копия уходит с ETag своей версии и не дает 304."""
+        url = reverse('posts:index')
+        old = self.guest_client.get(url)
+        Post.objects.create(author=PageCacheTest.user, text='Новый пост')
+        with mock.patch('posts.caching.single_flight', _busy_lock):
+            stale = self.guest_client.get(url)
+        self.assertNotContains(stale, 'Новый пост')
+        self.assertEqual(stale['ETag'], old['ETag'])
+        self.assertEqual(stale['Last-Modified'], old['Last-Modified'])
+        revalidated = self.guest_client.get(
+            url, HTTP_IF_NONE_MATCH=stale['ETag']
+        )
+        self.assertEqual(revalidated.status_code, 200)
+        self.assertContains(revalidated, 'Новый пост')
+        self.assertNotEqual(revalidated['ETag'], stale['ETag'])
+
+    def test_user_pages_not_shared(self):
+        """Страница авторизованного пользователя не попадает гостю."""
+        url = reverse('posts:index')
+        self.authorized_client.get(url)
+        response = self.guest_client.get(url)
+        self.assertNotContains(response, 'Пользователь: Cached')
+
+    def test_conditional_get(self):
+        """Неизмененная страница отдается ответом 304."""
+        url = reverse('posts:post_detail', args=[PageCacheTest.post.pk])
+        response = self.guest_client.get(url)
+        etag = response['ETag']
+        with self.assertNumQueries(1):
+            not_modified = self.guest_client.get(
+                url, HTTP_IF_NONE_MATCH=etag
+            )
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified.content, b'')
+        user_page = self.authorized_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(user_page.status_code, 200)
+        Comment.objects.create(
+            post=PageCacheTest.post, author=PageCacheTest.user, text='Новый'
+        )
+        changed = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(changed.status_code, 200)
+        self.assertContains(changed, 'Новый')
+
+    def test_edit_moves_last_modified(self):
+        """Правка поста меняет Last-Modified, а не только публикация."""
+        url = reverse('posts:post_detail', args=[PageCacheTest.post.pk])
+        response = self.guest_client.get(url)
+        since = response['Last-Modified']
+        self.assertEqual(
+            self.guest_client.get(
+                url, HTTP_IF_MODIFIED_SINCE=since
+            ).status_code,
+            304,
+        )
+        # Дата в заголовке с точностью до секунды: правка — позже.
+        later = caching._new_version() + 2 * 10 ** 9
+        with mock.patch('posts.caching._new_version', return_value=later):
+            PageCacheTest.post.text = 'Исправленный пост'
+            PageCacheTest.post.save()
+        edited = self.guest_client.get(url, HTTP_IF_MODIFIED_SINCE=since)
+        self.assertEqual(edited.status_code, 200)
+        self.assertContains(edited, 'Исправленный пост')
+
+
+@contextmanager
+def _busy_lock(key, timeout):
+    yield False
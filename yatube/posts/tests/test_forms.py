@@ -1,10 +1,14 @@
+import hashlib
+import io
 import shutil
 import tempfile
+from unittest import mock
 
 from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from PIL import Image
 
 from posts.models import Comment, Group, Post, User
 
@@ -42,7 +46,9 @@ class PostFormTests(TestCase):
             content=small_gif,
             content_type='image/gif'
         )
-        cls.picture = 'posts/small.gif'
+        # Картинка хранится под хэшем содержимого.
+        digest = hashlib.sha256(small_gif).hexdigest()
+        cls.picture = f'posts/{digest[:2]}/{digest}.gif'
 
     @classmethod
     def tearDownClass(cls):
@@ -149,3 +155,59 @@ class PostFormTests(TestCase):
         self.assertEqual(comment.text, form_data['text'])
         self.assertEqual(comment.post, PostFormTests.post)
         self.assertEqual(comment.author, PostFormTests.user)
+
+    def test_image_upload_limits(self):
+        """Большие, огромные по размерам и чужих форматов картинки
+        отклоняются, пост не создается."""
+        def upload(name, size, image_format):
+            buffer = io.BytesIO()
+            Image.new('RGB', size).save(buffer, image_format)
+            return SimpleUploadedFile(name, buffer.getvalue())
+
+        cases = {
+            'too_large': (upload('big.png', (300, 300), 'PNG'), {
+                'POSTS_IMAGE_MAX_BYTES': 100,
+            }),
+            'too_many_pixels': (upload('wide.png', (2000, 10), 'PNG'), {
+                'POSTS_IMAGE_MAX_SIDE': 1000,
+            }),
+            'format': (upload('old.bmp', (10, 10), 'BMP'), {}),
+        }
+        posts_count = Post.objects.count()
+        for code, (image, limits) in cases.items():
+            with self.subTest(code=code), self.settings(**limits), \
+                    mock.patch.object(Image.Image, 'verify') as verify:
+                response = self.authorized_client.post(
+                    reverse('posts:post_create'),
+                    data={'text': 'Пост с картинкой', 'image': image},
+                )
+                self.assertEqual(response.status_code, 200)
+                self.assertTrue(
+                    response.context['form'].has_error('image', code)
+                )
+                # Отклоненный файл ImageField не открывает.
+                verify.assert_not_called()
+                self.assertEqual(
+                    'image' in getattr(
+                        response.wsgi_request, 'rejected_uploads', {}
+                    ),
+                    code == 'too_large',
+                )
+        self.assertEqual(Post.objects.count(), posts_count)
+
+    @override_settings(POSTS_IMAGE_MAX_BYTES=100)
+    def test_too_large_upload_keeps_other_fields(self):
+        """Большой файл пропускается, а поля после него дочитываются."""
+        buffer = io.BytesIO()
+        Image.new('RGB', (300, 300)).save(buffer, 'PNG')
+        response = self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={
+                'image': SimpleUploadedFile('big.png', buffer.getvalue()),
+                'text': 'Текст после файла',
+            },
+        )
+        form = response.context['form']
+        self.assertTrue(form.has_error('image', 'too_large'))
+        self.assertEqual(form.data['text'], 'Текст после файла')
+        self.assertContains(response, 'Текст после файла')
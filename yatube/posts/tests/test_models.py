@@ -1,6 +1,9 @@
+from io import StringIO
+
+from django.core.management import call_command
 from django.test import TestCase
 
-from posts.models import Group, Post, User
+from posts.models import Comment, Follow, Group, Post, User, UserCounters
 
 
 class PostModelTest(TestCase):
@@ -50,3 +53,41 @@ class PostModelTest(TestCase):
             with self.subTest(field=field):
                 self.assertEqual(
                     post._meta.get_field(field).help_text, expected_value)
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+
+    def counters(self, user):
+        return UserCounters.objects.get(user=user)
+
+    def test_counters_follow_writes(self):
+        """Счетчики меняются вместе с постами, комментариями и подписками."""
+        post = Post.objects.create(author=self.author, text='Пост')
+        Comment.objects.create(post=post, author=self.reader, text='Да')
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(self.counters(self.author).posts_count, 1)
+        self.assertEqual(self.counters(self.author).followers_count, 1)
+        self.assertEqual(self.counters(self.reader).following_count, 1)
+        follow.delete()
+        post.comments.all().delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+        self.assertEqual(self.counters(self.author).followers_count, 0)
+        self.assertEqual(self.counters(self.reader).following_count, 0)
+
+    def test_recount_counters_repairs_drift(self):
+        """Команда recount_counters пересчитывает разошедшиеся счетчики."""
+        Post.objects.bulk_create(
+            Post(author=self.author, text=str(i)) for i in range(3)
+        )
+        UserCounters.objects.filter(user=self.reader).delete()
+        call_command('recount_counters', stdout=StringIO())
+        self.assertEqual(self.counters(self.author).posts_count, 3)
+        self.assertEqual(self.counters(self.reader).posts_count, 0)
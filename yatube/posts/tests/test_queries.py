@@ -0,0 +1,229 @@
+from unittest import skipUnless
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from posts.models import Comment, Follow, Group, Post, User
+from posts.paginators import CachedCountPaginator
+from posts.timeline import backfill
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN SQLite')
+class FeedIndexesTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        for i in range(15):
+            Post.objects.create(
+                author=cls.author, group=cls.group, text=f'Пост {i}'
+            )
+        cls.post = Post.objects.first()
+        Comment.objects.create(
+            post=cls.post, author=cls.reader, text='Комментарий'
+        )
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(FeedIndexesTest.reader)
+        cache.clear()
+
+    def feed_plans(self, url):
+        """Планы запросов страницы, сортирующих посты и комментарии."""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        plans = {}
+        with connection.cursor() as cursor:
+            for query in queries.captured_queries:
+                sql = query['sql']
+                if 'ORDER BY' not in sql:
+                    continue
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+                plans[sql] = ' | '.join(row[-1] for row in cursor.fetchall())
+        return response, plans
+
+    def test_feed_queries_use_indexes(self):
+        """Ленты читаются по индексу, без временной сортировки."""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.author}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}),
+            reverse('posts:follow_index'),
+        )
+        for url in urls:
+            for query in ('', '?after='):
+                response, plans = self.feed_plans(url + query)
+                page_obj = response.context.get('page_obj')
+                if query and page_obj is not None and page_obj.has_next():
+                    _, next_plans = self.feed_plans(
+                        url + '?after=' + page_obj.next_cursor()
+                    )
+                    plans.update(next_plans)
+                self.assertTrue(plans)
+                for sql, plan in plans.items():
+                    with self.subTest(url=url + query, sql=sql):
+                        self.assertNotIn('TEMP B-TREE', plan)
+                        self.assertIn('USING', plan)
+
+
+@override_settings(AUTH_USER_CACHE_TIMEOUT=0)
+class ViewQueryCountTest(TestCase):
+    """Число запросов страницы не зависит от числа постов и комментариев.
+
+    Кэш страниц очищается, сессии в тестах читаются из базы, а кэш
+    пользователя выключен, поэтому в каждое число входят два запроса
+    сессии и пользователя. Лента в одну страницу не выполняет COUNT(*):
+    ссылки на страницы ей не нужны.
+    """
+    sizes = (1, 10, 1000)
+
+    def make_feed(self, size):
+        author = User.objects.create_user(username=f'author{size}')
+        reader = User.objects.create_user(username=f'reader{size}')
+        group = Group.objects.create(
+            title='Группа', slug=f'group{size}', description='Описание'
+        )
+        Post.objects.bulk_create(
+            Post(author=author, group=group, text=f'Пост {i}')
+            for i in range(size)
+        )
+        post = Post.objects.filter(author=author).first()
+        Comment.objects.bulk_create(
+            Comment(post=post, author=reader, text=f'Комментарий {i}')
+            for i in range(size)
+        )
+        Follow.objects.create(user=reader, author=author)
+        backfill(reader, author)
+        return author, reader, group, post
+
+    def test_views_query_count(self):
+        """Страницы выполняют фиксированное число запросов."""
+        for size in self.sizes:
+            author, reader, group, post = self.make_feed(size)
+            client = Client()
+            client.force_login(reader)
+            pages = {
+                reverse('posts:index'): 4,
+                reverse(
+                    'posts:group_list', kwargs={'slug': group.slug}
+                ): 5,
+                reverse(
+                    'posts:profile', kwargs={'username': author.username}
+                ): 6,
+                reverse(
+                    'posts:post_detail', kwargs={'post_id': post.id}
+                ): 5,
+                reverse('posts:follow_index'): 5,
+            }
+            for url, expected in pages.items():
+                with self.subTest(size=size, url=url):
+                    cache.clear()
+                    with CaptureQueriesContext(connection) as queries:
+                        response = client.get(url)
+                    page_obj = response.context.get('page_obj')
+                    if page_obj is not None and isinstance(
+                        page_obj.paginator, CachedCountPaginator
+                    ) and not page_obj.has_other_pages():
+                        expected -= 1
+                    self.assertEqual(len(queries), expected)
+
+
+class CachedCountPaginatorTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        Post.objects.bulk_create(
+            Post(author=cls.author, text=f'Пост {i}') for i in range(12)
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_count_served_from_cache(self):
+        """COUNT(*) ленты выполняется один раз за время жизни кэша."""
+        with self.assertNumQueries(1):
+            CachedCountPaginator(Post.objects.all(), 10, 'feed').count
+        with self.assertNumQueries(0):
+            count = CachedCountPaginator(Post.objects.all(), 10, 'feed').count
+        self.assertEqual(count, 12)
+
+    def test_stale_count_does_not_truncate_page(self):
+        """Устаревшее число не обрезает последнюю страницу."""
+        CachedCountPaginator(Post.objects.all(), 10, 'feed').count
+        Post.objects.create(author=self.author, text='Новый пост')
+        paginator = CachedCountPaginator(Post.objects.all(), 10, 'feed')
+        self.assertEqual(len(paginator.page(2)), 3)
+
+    def test_stale_count_keeps_next_page(self):
+        """Следующая страница видна и при устаревшем нулевом числе."""
+        cache.set('posts:count:feed', 0)
+        paginator = CachedCountPaginator(Post.objects.all(), 10, 'feed')
+        first = paginator.get_page(1)
+        self.assertTrue(first.has_next())
+        last = paginator.get_page(2)
+        self.assertEqual(last.number, 2)
+        self.assertEqual(len(last), 2)
+        self.assertFalse(last.has_next())
+
+    def test_follow_resets_count(self):
+        """Подписка сбрасывает закэшированное число ленты подписок."""
+        reader = User.objects.create_user(username='reader')
+        other = User.objects.create_user(username='other')
+        Post.objects.bulk_create(
+            Post(author=other, text=f'Пост {i}') for i in range(15)
+        )
+        client = Client()
+        client.force_login(reader)
+        url = reverse('posts:follow_index')
+        for author, expected in ((self.author, 12), (other, 27)):
+            client.get(reverse('posts:profile_follow', args=[author]))
+            response = client.get(url)
+            page_obj = response.context['page_obj']
+            with self.subTest(author=author.username):
+                self.assertTrue(page_obj.has_next())
+                self.assertEqual(page_obj.paginator.count, expected)
+
+    @override_settings(POSTS_EXACT_COUNT_LIMIT=5)
+    def test_count_stops_at_limit(self):
+        """После порога строки не считаются до конца ленты."""
+        paginator = CachedCountPaginator(Post.objects.all(), 10)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(paginator.count, 6)
+        self.assertIn('LIMIT 6', queries[0]['sql'])
+        self.assertTrue(paginator.is_approximate)
+
+    def test_elided_page_range(self):
+        """Ссылки на страницы: края и соседи текущей через «…»."""
+        paginator = CachedCountPaginator(
+            Post.objects.all(), 10, count=10000
+        )
+        ellipsis = paginator.ELLIPSIS
+        cases = {
+            1: [1, 2, 3, ellipsis, 1000],
+            500: [1, ellipsis, 498, 499, 500, 501, 502, ellipsis, 1000],
+            1000: [1, ellipsis, 998, 999, 1000],
+        }
+        for number, expected in cases.items():
+            with self.subTest(number=number):
+                self.assertEqual(
+                    list(paginator.get_elided_page_range(number)), expected
+                )
+        short = CachedCountPaginator(Post.objects.all(), 10, count=30)
+        self.assertEqual(list(short.get_elided_page_range(2)), [1, 2, 3])
+
+    @override_settings(POSTS_EXACT_COUNT_LIMIT=10)
+    def test_many_pages_rendered_without_numbers(self):
+        """После порога вместо номеров страниц выводится «много»."""
+        response = Client().get(reverse('posts:index'))
+        self.assertTrue(response.context['page_obj'].paginator.is_approximate)
+        self.assertContains(response, 'из многих')
+        self.assertNotContains(response, 'Последняя')
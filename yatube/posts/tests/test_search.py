@@ -0,0 +1,84 @@
+from io import StringIO
+from unittest import skipUnless
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase
+from django.urls import reverse
+from posts.models import Post, User
+from posts.search import FTS_TABLE, SearchPaginator, build_match_query
+
+
+@skipUnless(connection.vendor == 'sqlite', 'FTS5 есть только в SQLite')
+class SearchTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Searcher')
+        cls.posts = [
+            Post.objects.create(author=cls.user, text=f'Кошка номер {i}')
+            for i in range(12)
+        ]
+        cls.frequent = Post.objects.create(
+            author=cls.user, text='Кошка кошка кошка'
+        )
+        Post.objects.create(author=cls.user, text='Про собак')
+
+    def setUp(self):
+        self.guest_client = Client()
+
+    def search(self, query, **kwargs):
+        return SearchPaginator(
+            Post.objects.all(), 10, query
+        ).get_cursor_page(**kwargs)
+
+    def test_match_query_escapes_operators(self):
+        """Операторы FTS5 из ввода превращаются в слова в кавычках."""
+        self.assertEqual(
+            build_match_query('кошка" OR * NEAR('), '"кошка" "OR" "NEAR"'
+        )
+        self.assertEqual(build_match_query('"*()'), '')
+
+    def test_results_ranked_and_paginated(self):
+        """Все слова обязательны, лучшее совпадение первое."""
+        self.assertEqual(len(self.search('кошка собак')), 0)
+        first = self.search('КОШКА')
+        self.assertEqual(first[0], SearchTest.frequent)
+        self.assertTrue(first.has_next())
+        second = self.search('кошка', after=first.next_cursor())
+        self.assertEqual(len(second), 3)
+        self.assertFalse(second.has_next())
+        self.assertFalse(set(first) & set(second))
+        back = self.search('кошка', before=second.previous_cursor())
+        self.assertEqual(list(back), list(first))
+
+    def test_index_follows_post_changes(self):
+        """Триггеры обновляют индекс при изменении и удалении поста."""
+        post = Post.objects.get(pk=SearchTest.posts[0].pk)
+        post.text = 'Теперь про попугая'
+        post.save()
+        self.assertEqual(list(self.search('попугая')), [post])
+        post.delete()
+        self.assertEqual(len(self.search('попугая')), 0)
+
+    def test_rebuild_command(self):
+        """Команда восстанавливает индекс после его очистки."""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('delete-all')"
+            )
+        self.assertEqual(len(self.search('собак')), 0)
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(len(self.search('собак')), 1)
+
+    def test_search_page(self):
+        """Страница поиска выводит найденные посты и ссылку дальше."""
+        response = self.guest_client.get(
+            reverse('posts:search'), {'q': 'кошка'}
+        )
+        self.assertTemplateUsed(response, 'posts/search.html')
+        self.assertEqual(response.context['page_obj'][0], SearchTest.frequent)
+        self.assertNotContains(response, 'Про собак')
+        self.assertContains(
+            response, '?q=%D0%BA%D0%BE%D1%88%D0%BA%D0%B0&amp;after='
+        )
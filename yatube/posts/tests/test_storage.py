@@ -0,0 +1,83 @@
+import hashlib
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from posts.images import release_image
+from posts.models import Post, User
+from posts.storage import image_storage
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ContentAddressedStorageTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Uploader')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def create_post(self, filename):
+        return Post.objects.create(
+            author=ContentAddressedStorageTest.user, text='Пост',
+            image=SimpleUploadedFile(filename, SMALL_GIF, 'image/gif'),
+        )
+
+    def test_same_content_stored_once(self):
+        """Одинаковые загрузки хранятся одним файлом под хэшем."""
+        first = self.create_post('meme.gif')
+        second = self.create_post('Copy of meme.GIF')
+        digest = hashlib.sha256(SMALL_GIF).hexdigest()
+        self.assertEqual(first.image.name, f'posts/{digest[:2]}/{digest}.gif')
+        self.assertEqual(second.image.name, first.image.name)
+        self.assertEqual(
+            os.listdir(image_storage.path(f'posts/{digest[:2]}')),
+            [f'{digest}.gif'],
+        )
+        self.assertEqual(os.listdir(image_storage.path('posts')), [digest[:2]])
+
+    @override_settings(POSTS_IMAGE_RELEASE_GRACE=0)
+    def test_file_released_with_last_post(self):
+        """Файл удаляется, когда на него не ссылается ни один пост."""
+        first = self.create_post('one.gif')
+        second = self.create_post('two.gif')
+        name = first.image.name
+        first.delete()
+        self.assertFalse(release_image(name))
+        self.assertTrue(image_storage.exists(name))
+        second.delete()
+        self.assertTrue(release_image(name))
+        self.assertFalse(image_storage.exists(name))
+
+    def test_reused_file_not_released(self):
+        """Файл, который только что переиспользовала загрузка, остается."""
+        post = self.create_post('one.gif')
+        name = post.image.name
+        old = os.path.getmtime(image_storage.path(name)) - 3600
+        os.utime(image_storage.path(name), (old, old))
+        post.delete()
+        # Параллельная загрузка тех же байтов, пост еще не сохранен.
+        self.assertEqual(
+            image_storage.save(
+                'posts/copy.gif', SimpleUploadedFile('copy.gif', SMALL_GIF)
+            ),
+            name,
+        )
+        self.assertFalse(release_image(name))
+        self.assertTrue(image_storage.exists(name))
@@ -0,0 +1,138 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+from posts.models import Follow, Group, Post, TimelineEntry, User
+from posts.transfer import PostImporter, read_rows
+
+
+class TransferTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Writer')
+        cls.reader = User.objects.create_user(username='Reader')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        cls.post = Post.objects.create(
+            author=cls.author, group=cls.group, text='Первый пост'
+        )
+        Post.objects.create(author=cls.author, text='Второй "пост", с запятой')
+        cls.directory = tempfile.mkdtemp()
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.directory, ignore_errors=True)
+        super().tearDownClass()
+
+    def export(self, name):
+        path = os.path.join(TransferTest.directory, name)
+        call_command('export_posts', path, stderr=io.StringIO())
+        return path
+
+    def test_profile_export(self):
+        """Посты автора отдаются потоком NDJSON, по строке на пост."""
+        response = Client().get(reverse(
+            'posts:profile_export', args=[TransferTest.author.username]
+        ))
+        self.assertTrue(response.streaming)
+        self.assertEqual(
+            response['Content-Type'], 'application/x-ndjson; charset=utf-8'
+        )
+        rows = [
+            json.loads(line)
+            for line in b''.join(response.streaming_content).splitlines()
+        ]
+        self.assertEqual([row['id'] for row in rows], sorted(
+            TransferTest.author.posts.values_list('pk', flat=True)
+        ))
+        self.assertEqual(rows[0]['group'], 'group')
+        self.assertEqual(rows[0]['author'], 'Writer')
+        missing = Client().get(
+            reverse('posts:profile_export', args=['Nobody'])
+        )
+        self.assertEqual(missing.status_code, 404)
+
+    def test_profile_export_filename(self):
+        """Имя файла с кириллицей передается через filename*."""
+        for username, expected in (
+            ('Writer', 'attachment; filename="Writer.ndjson"; '
+                       "filename*=UTF-8''Writer.ndjson"),
+            ('Иван', 'attachment; filename="posts.ndjson"; '
+                     "filename*=UTF-8''%D0%98%D0%B2%D0%B0%D0%BD.ndjson"),
+            ('Ivan_Иван', 'attachment; filename="Ivan.ndjson"; '
+                          "filename*=UTF-8''Ivan_%D0%98%D0%B2%D0%B0%D0%BD"
+                          '.ndjson'),
+        ):
+            with self.subTest(username=username):
+                User.objects.get_or_create(username=username)
+                response = Client().get(
+                    reverse('posts:profile_export', args=[username])
+                )
+                self.assertEqual(response['Content-Disposition'], expected)
+
+    def test_round_trip(self):
+        """Выгрузка в NDJSON и CSV загружается обратно без потерь."""
+        for name in ('posts.ndjson', 'posts.csv'):
+            with self.subTest(name=name):
+                path = self.export(name)
+                before = Post.objects.count()
+                call_command('import_posts', path, stdout=io.StringIO())
+                copies = Post.objects.filter(
+                    text=TransferTest.post.text
+                ).order_by('-pk')
+                self.assertEqual(Post.objects.count(), before * 2)
+                self.assertEqual(copies[0].group, TransferTest.group)
+                self.assertEqual(copies[0].pub_date, copies[1].pub_date)
+                self.assertTrue(Post.objects.filter(
+                    text='Второй "пост", с запятой', group=None
+                ).count() > 1)
+
+    def test_import_updates_counters_and_timelines(self):
+        """После загрузки обновлены счетчики и лента подписчика."""
+        path = self.export('posts.ndjson')
+        call_command(
+            'import_posts', path, batch_size=1, chunk_size=1,
+            stdout=io.StringIO(),
+        )
+        self.assertEqual(
+            User.objects.get(pk=TransferTest.author.pk).counters.posts_count,
+            4,
+        )
+        self.assertEqual(TimelineEntry.objects.filter(
+            user=TransferTest.reader
+        ).count(), 4)
+
+    def test_bad_rows_skipped(self):
+        """Строки без автора, с неизвестной группой или битые пропускаются."""
+        lines = [
+            {'author': 'Writer', 'text': 'Пост'},
+            {'author': 'Nobody', 'text': 'Пост'},
+            {'author': 'Writer', 'group': 'missing', 'text': 'Пост'},
+            {'author': 'Writer', 'text': ''},
+        ]
+        stream = io.StringIO(
+            '\n'.join(json.dumps(line) for line in lines) + '\n{oops\n[]\n'
+        )
+        importer = PostImporter()
+        progress = importer.run(read_rows(stream, 'ndjson'))
+        self.assertEqual(progress.rows, 1)
+        self.assertEqual(importer.skipped, 5)
+
+    def test_create_missing(self):
+        """С create_missing неизвестные автор и группа создаются."""
+        stream = io.StringIO(json.dumps(
+            {'author': 'Newcomer', 'group': 'fresh', 'text': 'Привет'}
+        ))
+        importer = PostImporter(create_missing=True)
+        importer.run(read_rows(stream, 'ndjson'))
+        post = Post.objects.get(text='Привет')
+        self.assertEqual(post.author.username, 'Newcomer')
+        self.assertEqual(post.group.slug, 'fresh')
@@ -1,13 +1,17 @@
+import hashlib
 import shutil
 import tempfile
+from io import StringIO
 
 from django import forms
 from django.conf import settings
 from django.core.cache import cache
+from django.core.management import call_command
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
-from posts.models import Comment, Follow, Group, Post, User
+from posts.models import Comment, Follow, Group, Post, TimelineEntry, User
+from posts.tests.utils import run_on_commit
 
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
@@ -31,6 +35,8 @@ class PostPagesTest(TestCase):
             content=small_gif,
             content_type='image/gif'
         )
+        digest = hashlib.sha256(small_gif).hexdigest()
+        cls.picture = f'posts/{digest[:2]}/{digest}.gif'
         cls.user = User.objects.create_user(username='uKurva')
         cls.group = Group.objects.create(
             title='Тестовая группа',
@@ -89,7 +95,7 @@ class PostPagesTest(TestCase):
         task_group = post.group
         self.assertEqual(
             task_image,
-            'posts/small.gif'
+            PostPagesTest.picture
         )
         self.assertEqual(
             task_author,
@@ -147,6 +153,40 @@ class PostPagesTest(TestCase):
                     8
                 )
 
+    def test_cursor_paginator_correct_context(self):
+        """Курсорная пагинация проходит ленту без пропусков и повторов."""
+        Post.objects.bulk_create(
+            Post(author=PostPagesTest.user, text=f'Курсор {i}')
+            for i in range(1, 18)
+        )
+        expected = list(
+            Post.objects.order_by('-pub_date', '-id').values_list(
+                'id', flat=True
+            )
+        )
+        url = reverse('posts:index')
+        response = self.guest_client.get(url + '?after=')
+        page_obj = response.context['page_obj']
+        self.assertTrue(page_obj.is_cursor)
+        self.assertFalse(page_obj.has_previous())
+        seen = [post.id for post in page_obj]
+        while page_obj.has_next():
+            cache.clear()
+            response = self.guest_client.get(
+                url + '?after=' + page_obj.next_cursor()
+            )
+            page_obj = response.context['page_obj']
+            seen += [post.id for post in page_obj]
+        self.assertEqual(seen, expected)
+        cache.clear()
+        response = self.guest_client.get(
+            url + '?before=' + page_obj.previous_cursor()
+        )
+        self.assertEqual(
+            [post.id for post in response.context['page_obj']],
+            expected[:10]
+        )
+
     def test_views_correct_template(self):
         """URL-адрес использует соответствующий шаблон."""
         for template, reverse_name in self.templates_pages_names.items():
@@ -186,6 +226,54 @@ class PostPagesTest(TestCase):
         self.assertEqual(response.context.get("post").author, self.post.author)
         self.assertEqual(response.context.get("post").group, self.post.group)
 
+    def test_post_detail_comments_paginated(self):
+        """Комментарии поста выводятся порциями и догружаются фрагментом."""
+        Comment.objects.bulk_create(
+            Comment(author=self.user, post=self.post, text=f'Ответ {i}')
+            for i in range(24)
+        )
+        response = self.guest_client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        )
+        comments = response.context['comments']
+        self.assertEqual(len(comments), 20)
+        self.assertTrue(comments.has_next())
+        response = self.guest_client.get(
+            reverse('posts:post_comments', kwargs={'post_id': self.post.id}),
+            {'after': comments.next_cursor()}
+        )
+        self.assertTemplateUsed(response, 'posts/includes/comment_list.html')
+        self.assertEqual(len(response.context['comments']), 5)
+        self.assertFalse(response.context['comments'].has_next())
+
+    @override_settings(POSTS_THUMBNAIL_WORKERS=2)
+    def test_thumbnail_placeholder_until_generated(self):
+        """Пока миниатюры нет, страница отдает заглушку.
+
+        Миниатюры создает фоновый пул после фиксации транзакции и
+        сбрасывает страницы с заглушкой.
+        """
+        response = self.guest_client.get(reverse('posts:index'))
+        self.assertContains(response, 'data:image/svg+xml')
+        run_on_commit()
+        response = self.guest_client.get(reverse('posts:index'))
+        self.assertNotContains(response, 'data:image/svg+xml')
+        self.assertContains(response, settings.MEDIA_URL + 'cache/')
+
+    def test_post_image_srcset(self):
+        """Картинка выводится набором ширин с размерами и ленивой загрузкой."""
+        call_command('warm_thumbnails', workers=1, stdout=StringIO())
+        response = self.guest_client.get(reverse('posts:index'))
+        for text in (
+            ' 320w, ', ' 640w, ', ' 960w"', 'width="960" height="339"',
+            'loading="lazy"', 'sizes="(max-width: 960px) 100vw, 960px"',
+        ):
+            with self.subTest(text=text):
+                self.assertContains(response, text)
+        picture = response.content.decode().split('<picture>', 1)[1]
+        img = picture.split('<img', 1)[1].split('>', 1)[0]
+        self.assertIn('.jpg 320w', img)
+
     def test_create_edit_show_correct_context(self):
         """Шаблон create_edit сформирован с правильным контекстом."""
         response = self.authorized_client.get(
@@ -243,7 +331,7 @@ class PostPagesTest(TestCase):
                 self.assertNotIn(expected, form_field)
 
     def test_index_caches(self):
-        """Тестирование кэша главной страницы."""
+        """Кэш главной страницы сбрасывается только при изменениях."""
         new_post = Post.objects.create(
             author=PostPagesTest.user,
             text='Этот пост создан быть удаленным)',
@@ -252,19 +340,38 @@ class PostPagesTest(TestCase):
         response_1 = self.authorized_client.get(
             reverse('posts:index')
         )
-        response_content_1 = response_1.content
-        new_post.delete()
+        Post.objects.filter(pk=new_post.pk).update(text='Без сигналов')
         response_2 = self.authorized_client.get(
             reverse('posts:index')
         )
-        response_content_2 = response_2.content
-        self.assertEqual(response_content_1, response_content_2)
-        cache.clear()
+        self.assertEqual(response_1.content, response_2.content)
+        new_post.delete()
         response_3 = self.authorized_client.get(
             reverse('posts:index')
         )
-        response_content_3 = response_3.content
-        self.assertNotEqual(response_content_2, response_content_3)
+        self.assertNotEqual(response_2.content, response_3.content)
+
+    def test_pages_cache_invalidation(self):
+        """Запись поста и комментария сразу видна на страницах."""
+        urls = (
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user.username}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}),
+        )
+        for url in urls:
+            self.guest_client.get(url)
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'Отредактированный текст'
+        post.save()
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                self.assertContains(response, 'Отредактированный текст')
+        Comment.objects.create(
+            author=self.user, post=self.post, text='Свежий комментарий'
+        )
+        response = self.guest_client.get(urls[-1])
+        self.assertContains(response, 'Свежий комментарий')
 
     def test_follow(self):
         """Тестирование подписки на автора."""
@@ -316,3 +423,81 @@ class PostPagesTest(TestCase):
         )
         context_follow = response_follow.context
         self.post_exist(context_follow)
+
+    def test_timeline_fan_out(self):
+        """Посты раскладываются по лентам и убираются после отписки."""
+        reader = User.objects.create(username='Reader')
+        client = Client()
+        client.force_login(reader)
+        client.get(reverse(
+            'posts:profile_follow',
+            kwargs={'username': PostPagesTest.user.username}
+        ))
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=reader, post=PostPagesTest.post
+        ).exists())
+        new_post = Post.objects.create(
+            author=PostPagesTest.user, text='Разложенный пост'
+        )
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=reader, post=new_post
+        ).exists())
+        client.get(reverse(
+            'posts:profile_unfollow',
+            kwargs={'username': PostPagesTest.user.username}
+        ))
+        self.assertFalse(TimelineEntry.objects.filter(user=reader).exists())
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1)
+    def test_timeline_hybrid_fan_out_on_read(self):
+        """Посты популярного автора читаются в ленте без раскладки."""
+        reader = User.objects.create(username='Reader')
+        Follow.objects.create(user=reader, author=PostPagesTest.user)
+        new_post = Post.objects.create(
+            author=PostPagesTest.user, text='Пост популярного автора'
+        )
+        self.assertFalse(TimelineEntry.objects.exists())
+        client = Client()
+        client.force_login(reader)
+        response = client.get(reverse('posts:follow_index'))
+        self.assertIn(new_post, response.context['page_obj'])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=2)
+    def test_timeline_backfilled_below_limit(self):
+        """После падения ниже порога посты автора раскладываются в ленты."""
+        reader = User.objects.create(username='Reader')
+        other = User.objects.create(username='Other')
+        Follow.objects.create(user=reader, author=PostPagesTest.user)
+        Follow.objects.create(user=other, author=PostPagesTest.user)
+        hot_post = Post.objects.create(
+            author=PostPagesTest.user, text='Пост без раскладки'
+        )
+        self.assertFalse(TimelineEntry.objects.filter(post=hot_post).exists())
+        client = Client()
+        client.force_login(other)
+        client.get(reverse(
+            'posts:profile_unfollow',
+            kwargs={'username': PostPagesTest.user.username}
+        ))
+        run_on_commit()
+        client.force_login(reader)
+        response = client.get(reverse('posts:follow_index'))
+        self.assertIn(hot_post, response.context['page_obj'])
+        self.assertIn(PostPagesTest.post, response.context['page_obj'])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=3)
+    def test_timeline_backfilled_after_bulk_unfollow(self):
+        """Удаление нескольких подписок разом тоже дополняет ленты."""
+        readers = [
+            User.objects.create(username=f'Reader{i}') for i in range(4)
+        ]
+        for reader in readers:
+            Follow.objects.create(user=reader, author=PostPagesTest.user)
+        hot_post = Post.objects.create(
+            author=PostPagesTest.user, text='Пост без раскладки'
+        )
+        Follow.objects.filter(user__in=readers[1:]).delete()
+        run_on_commit()
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=readers[0], post=hot_post
+        ).exists())
@@ -0,0 +1,12 @@
+from django.db import connection
+
+
+def run_on_commit():
+    """Выполняем отложенные transaction.on_commit внутри TestCase.
+
+    TestCase не фиксирует транзакцию, и колбэки иначе не вызываются.
+    """
+    while connection.run_on_commit:
+        callbacks, connection.run_on_commit = connection.run_on_commit, []
+        for _, callback in callbacks:
+            callback()
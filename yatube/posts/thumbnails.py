@@ -0,0 +1,165 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+
+from core.metrics import THUMBNAIL_DURATION
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from PIL import features
+from sorl.thumbnail import default
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import DummyImageFile, ImageFile
+
+from .caching import invalidate_image
+from .locks import single_flight
+from .storage import image_storage
+
+
+logger = logging.getLogger(__name__)
+
+# Размеры картинок из шаблонов лент и страницы поста и ширины
+# уменьшенных копий для srcset.
+IMAGE_SIZES = {
+    '960x339': (320, 640, 960),
+    '950x450': (320, 640, 950),
+}
+THUMBNAIL_OPTIONS = {'crop': 'center', 'upscale': True}
+
+_executor = None
+_executor_guard = threading.Lock()
+
+
+def image_formats():
+    """Форматы копий: WebP, если Pillow собран с ним, и JPEG для всех."""
+    if features.check('webp'):
+        return ('WEBP', 'JPEG')
+    return ('JPEG',)
+
+
+def thumbnail_variants(size, image_format):
+    """(геометрия, параметры sorl) копий размера size по возрастанию."""
+    base_width, base_height = map(int, size.split('x'))
+    for width in IMAGE_SIZES[size]:
+        height = round(base_height * width / base_width)
+        yield f'{width}x{height}', {
+            **THUMBNAIL_OPTIONS, 'format': image_format
+        }
+
+
+def _all_variants():
+    for size in IMAGE_SIZES:
+        for image_format in image_formats():
+            yield from thumbnail_variants(size, image_format)
+
+
+class PlaceholderImageFile(DummyImageFile):
+    """Заглушка нужных пропорций, пока миниатюра готовится в фоне."""
+
+    @property
+    def url(self):
+        svg = (
+            "<svg xmlns='http://www.w3.org/2000/svg' "
+            f"width='{self.x}' height='{self.y}'>"
+            "<rect width='100%' height='100%' fill='#e9ecef'/></svg>"
+        )
+        return 'data:image/svg+xml,' + quote(svg)
+
+
+class _InlineExecutor:
+    """Исполнитель в вызывающем потоке.
+
+    Потоки не могут делить базу SQLite в памяти, например тестовую,
+    поэтому с ней задачи пула выполняются сразу.
+    """
+
+    def submit(self, fn, *args, **kwargs):
+        fn(*args, **kwargs)
+
+
+def _get_executor():
+    global _executor
+    if getattr(connection, 'is_in_memory_db', lambda: False)():
+        return _InlineExecutor()
+    with _executor_guard:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.POSTS_THUMBNAIL_WORKERS,
+                thread_name_prefix='thumbnails',
+            )
+        return _executor
+
+
+def generate_thumbnails(name):
+    """Синхронно создаем миниатюры всех известных размеров и форматов."""
+    backend = default.backend
+    with single_flight(f'thumbnail:{name}', 60) as leader:
+        if not leader:
+            return False
+        for geometry, options in _all_variants():
+            started = time.perf_counter()
+            ThumbnailBackend.get_thumbnail(
+                backend, ImageFile(name, image_storage), geometry, **options
+            )
+            THUMBNAIL_DURATION.observe(
+                time.perf_counter() - started, geometry=geometry
+            )
+    return True
+
+
+def _generate_in_worker(name):
+    try:
+        if generate_thumbnails(name):
+            # Страницы, отданные с заглушкой, и их ETag устарели.
+            invalidate_image(name)
+    except Exception:
+        logger.exception('Не удалось создать миниатюры для %s', name)
+    finally:
+        close_old_connections()
+
+
+def schedule_thumbnails(name):
+    """Отдаем создание миниатюр фоновому пулу после фиксации транзакции."""
+    if not name:
+        return
+    if not settings.POSTS_THUMBNAIL_WORKERS:
+        generate_thumbnails(name)
+        return
+    transaction.on_commit(
+        lambda: _get_executor().submit(_generate_in_worker, name)
+    )
+
+
+class AsyncThumbnailBackend(ThumbnailBackend):
+    """Бэкенд sorl, который не ресайзит известные размеры в запросе.
+
+    Готовая миниатюра берется из хранилища ключей, иначе создание
+    уходит в фоновый пул, а шаблон получает заглушку.
+    """
+
+    def get_thumbnail(self, file_, geometry_string, **options):
+        known = (geometry_string, options) in _all_variants()
+        if not file_ or not known or not settings.POSTS_THUMBNAIL_WORKERS:
+            return super().get_thumbnail(file_, geometry_string, **options)
+        cached = self.get_cached_thumbnail(file_, geometry_string, **options)
+        if cached:
+            return cached
+        schedule_thumbnails(getattr(file_, 'name', file_))
+        return PlaceholderImageFile(geometry_string)
+
+    def get_cached_thumbnail(self, file_, geometry_string, **options):
+        """Миниатюра из хранилища ключей без ее создания."""
+        source = ImageFile(file_)
+        if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(sorl_settings, attr)
+            if value != getattr(sorl_defaults, attr):
+                options.setdefault(key, value)
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        return default.kvstore.get(ImageFile(name, default.storage))
@@ -0,0 +1,190 @@
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Follow, Post, TimelineEntry, UserCounters
+
+
+def is_fanout_author(author):
+    """Раскладываем посты автора по лентам, пока подписчиков немного.
+
+    Посты авторов с числом подписчиков от TIMELINE_FANOUT_LIMIT
+    читаются из таблицы постов при открытии ленты.
+    """
+    followers = UserCounters.objects.filter(user=author).values_list(
+        'followers_count', flat=True
+    ).first()
+    if followers is None:
+        followers = author.following.count()
+    return followers < settings.TIMELINE_FANOUT_LIMIT
+
+
+def _mark_stale(counters):
+    # Ленты дополнит backfill_below_limit, когда автор станет обычным.
+    counters.filter(timeline_stale=False).update(timeline_stale=True)
+
+
+def _bulk_insert(entries):
+    TimelineEntry.objects.bulk_create(
+        entries,
+        batch_size=settings.TIMELINE_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def _batched(rows, build):
+    batch = []
+    for row in rows:
+        batch.append(build(row))
+        if len(batch) >= settings.TIMELINE_BATCH_SIZE:
+            _bulk_insert(batch)
+            batch = []
+    if batch:
+        _bulk_insert(batch)
+
+
+def fan_out(post):
+    """Добавляем новый пост в ленты всех подписчиков автора."""
+    if not is_fanout_author(post.author):
+        _mark_stale(UserCounters.objects.filter(user_id=post.author_id))
+        return
+    followers = Follow.objects.filter(author_id=post.author_id).values_list(
+        'user_id', flat=True
+    )
+    _batched(
+        followers.iterator(),
+        lambda user_id: TimelineEntry(
+            user_id=user_id, post_id=post.pk, pub_date=post.pub_date
+        ),
+    )
+
+
+def backfill(user, author):
+    """Заполняем ленту подписчика постами автора пачками."""
+    if not is_fanout_author(author):
+        _mark_stale(UserCounters.objects.filter(user_id=author.pk))
+        return
+    posts = author.posts.order_by().values_list('pk', 'pub_date')
+    _batched(
+        posts.iterator(),
+        lambda row: TimelineEntry(
+            user_id=user.pk, post_id=row[0], pub_date=row[1]
+        ),
+    )
+
+
+def fan_out_range(first_id, last_id):
+    """Раскладываем посты с id из диапазона одним INSERT ... SELECT.
+
+    Нужно после bulk_create, при котором сигнал post_save не приходит.
+    Уже разложенные записи пропускаются.
+    """
+    if first_id is None:
+        return 0
+    _mark_stale(UserCounters.objects.filter(
+        followers_count__gte=settings.TIMELINE_FANOUT_LIMIT,
+        user__posts__id__range=(first_id, last_id),
+    ))
+    follow = Follow._meta.db_table
+    post = Post._meta.db_table
+    counters = UserCounters._meta.db_table
+    timeline = TimelineEntry._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {timeline} (user_id, post_id, pub_date) '
+            f'SELECT f.user_id, p.id, p.pub_date FROM {post} p '
+            f'JOIN {follow} f ON f.author_id = p.author_id '
+            f'LEFT JOIN {counters} c ON c.user_id = p.author_id '
+            f'WHERE p.id BETWEEN %s AND %s '
+            f'AND COALESCE(c.followers_count, 0) < %s '
+            f'AND NOT EXISTS (SELECT 1 FROM {timeline} t '
+            f'WHERE t.user_id = f.user_id AND t.post_id = p.id)',
+            [first_id, last_id, settings.TIMELINE_FANOUT_LIMIT],
+        )
+        return cursor.rowcount
+
+
+def backfill_followers(author_id):
+    """Раскладываем все посты автора по лентам его подписчиков.
+
+    Один INSERT ... SELECT; уже разложенные записи пропускаются.
+    """
+    follow = Follow._meta.db_table
+    post = Post._meta.db_table
+    timeline = TimelineEntry._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {timeline} (user_id, post_id, pub_date) '
+            f'SELECT f.user_id, p.id, p.pub_date FROM {post} p '
+            f'JOIN {follow} f ON f.author_id = p.author_id '
+            f'WHERE p.author_id = %s '
+            f'AND NOT EXISTS (SELECT 1 FROM {timeline} t '
+            f'WHERE t.user_id = f.user_id AND t.post_id = p.id)',
+            [author_id],
+        )
+        return cursor.rowcount
+
+
+def backfill_below_limit(author_id):
+    """Автор опустился ниже порога — раскладываем его посты заново.
+
+    Посты, написанные при TIMELINE_FANOUT_LIMIT подписчиков и больше,
+    в ленты не попадали, а читать их напрямую лента перестает. Флаг
+    timeline_stale снимает только один вызов, даже если подписки
+    удалены пачкой в одной транзакции.
+    """
+    claimed = UserCounters.objects.filter(
+        user_id=author_id,
+        timeline_stale=True,
+        followers_count__lt=settings.TIMELINE_FANOUT_LIMIT,
+    ).update(timeline_stale=False)
+    if claimed:
+        return backfill_followers(author_id)
+    return 0
+
+
+def prune(user, author):
+    """Убираем из ленты подписчика посты автора после отписки."""
+    TimelineEntry.objects.filter(user=user, post__author=author).delete()
+
+
+def follow_feed(user):
+    """Посты ленты подписок и ключ их курсорной пагинации.
+
+    Обычные авторы читаются из материализованной ленты по ее индексу
+    (user, -pub_date, -post), популярные — напрямую из постов
+    (гибридный fan-out-on-read).
+    """
+    hot_authors = list(Follow.objects.filter(
+        user=user,
+        author__counters__followers_count__gte=settings.TIMELINE_FANOUT_LIMIT,
+    ).values_list('author', flat=True))
+    if not hot_authors:
+        posts = Post.objects.select_related('author', 'group').filter(
+            timeline_entries__user=user
+        ).annotate(
+            feed_date=F('timeline_entries__pub_date'),
+            feed_id=F('timeline_entries__post_id'),
+        ).order_by('-feed_date', '-feed_id')
+        return posts, ('feed_date', 'feed_id')
+    entries = TimelineEntry.objects.filter(user=user).values('post_id')
+    posts = Post.objects.select_related('author', 'group').filter(
+        Q(pk__in=entries) | Q(author_id__in=hot_authors)
+    )
+    return posts, ('pub_date', 'id')
+
+
+@receiver(post_save, sender=Post, dispatch_uid='posts_timeline_fan_out')
+def fan_out_on_create(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        fan_out(instance)
+
+
+@receiver(post_delete, sender=Follow, dispatch_uid='posts_timeline_unfollow')
+def backfill_on_unfollow(sender, instance, **kwargs):
+    # После фиксации: при удалении автора каскадом его посты удаляются
+    # в той же транзакции, и раскладывать их нельзя.
+    author_id = instance.author_id
+    transaction.on_commit(lambda: backfill_below_limit(author_id))
@@ -0,0 +1,208 @@
+import csv
+import itertools
+import json
+import time
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.db.models import F, Max
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .caching import GLOBAL_SCOPE, bump_versions
+from .counters import recount
+from .models import Group, Post, User
+from .timeline import fan_out_range
+
+FIELDS = ('id', 'author', 'group', 'text', 'pub_date', 'image')
+FORMATS = ('ndjson', 'csv')
+# Сколько пропущенных строк перечислять в отчете поименно.
+MAX_REPORTED_SKIPS = 20
+
+
+@contextmanager
+def explicit_pub_date(*models):
+    """Отключаем auto_now_add, чтобы bulk_create сохранил даты из прошлого.
+
+    Поле меняется у класса, поэтому годится только для команд,
+    а не для процесса, обслуживающего запросы.
+    """
+    fields = [model._meta.get_field('pub_date') for model in models]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def guess_format(path, default='ndjson'):
+    if path and path.lower().endswith('.csv'):
+        return 'csv'
+    return default
+
+
+class Progress:
+    """Число строк и скорость для отчета команды."""
+
+    def __init__(self, log=None, every=100000):
+        self.log = log or (lambda message: None)
+        self.every = every
+        self.rows = 0
+        self.started = time.perf_counter()
+
+    @property
+    def rate(self):
+        elapsed = time.perf_counter() - self.started
+        return self.rows / elapsed if elapsed else 0.0
+
+    def add(self, count=1):
+        before = self.rows
+        self.rows += count
+        if self.rows // self.every > before // self.every:
+            self.log(f'{self.rows} строк, {self.rate:.0f} строк/с')
+
+
+def export_rows(queryset=None, chunk_size=2000):
+    """Посты словарями без создания моделей, потоком по chunk_size."""
+    queryset = Post.objects.all() if queryset is None else queryset
+    return queryset.order_by('pk').values(
+        'id', 'text', 'image', 'pub_date',
+        author_name=F('author__username'),
+        group_slug=F('group__slug'),
+    ).iterator(chunk_size=chunk_size)
+
+
+def serialize(row):
+    return {
+        'id': row['id'],
+        'author': row['author_name'],
+        'group': row['group_slug'] or '',
+        'text': row['text'],
+        'pub_date': row['pub_date'].isoformat(),
+        'image': row['image'] or '',
+    }
+
+
+def write_rows(rows, stream, fmt, progress=None):
+    """Пишем строки в NDJSON или CSV, не накапливая их в памяти."""
+    progress = progress or Progress()
+    if fmt == 'csv':
+        writer = csv.DictWriter(stream, fieldnames=FIELDS)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(serialize(row))
+            progress.add()
+    else:
+        for row in rows:
+            stream.write(json.dumps(serialize(row), ensure_ascii=False))
+            stream.write('\n')
+            progress.add()
+    return progress
+
+
+def read_rows(stream, fmt):
+    """Строки файла выгрузки словарями, по одной."""
+    if fmt == 'csv':
+        yield from csv.DictReader(stream)
+        return
+    for line in stream:
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            # Строку отбросит PostImporter и учтет как пропущенную.
+            yield None
+
+
+class PostImporter:
+    """Загрузка постов пачками bulk_create в транзакциях по chunk_size строк.
+
+    Авторы и группы ищутся в словарях, загруженных один раз. Неизвестные
+    авторы и группы создаются при create_missing, иначе строка
+    пропускается. Сигналы при bulk_create не приходят, поэтому счетчики,
+    ленты подписок и кэш страниц обновляются после загрузки.
+    """
+
+    def __init__(self, batch_size=1000, chunk_size=20000,
+                 create_missing=False, log=None):
+        self.batch_size = batch_size
+        self.chunk_size = max(chunk_size, batch_size)
+        self.create_missing = create_missing
+        self.log = log or (lambda message: None)
+        self.authors = dict(User.objects.values_list('username', 'pk'))
+        self.groups = dict(Group.objects.values_list('slug', 'pk'))
+        self.skipped = 0
+        self.progress = Progress(self.log)
+
+    def _author_id(self, username):
+        if not username:
+            return None
+        if username not in self.authors and self.create_missing:
+            self.authors[username] = User.objects.create(
+                username=username, password='!'
+            ).pk
+        return self.authors.get(username)
+
+    def _group_id(self, slug):
+        if not slug:
+            return None
+        if slug not in self.groups and self.create_missing:
+            self.groups[slug] = Group.objects.create(
+                title=slug, slug=slug, description=''
+            ).pk
+        return self.groups.get(slug, False)
+
+    def build(self, number, row):
+        """Пост из строки выгрузки или None, если строку нельзя загрузить."""
+        author_id = self._author_id(row.get('author'))
+        group_id = self._group_id(row.get('group'))
+        pub_date = parse_datetime(row.get('pub_date') or '') or self.now
+        if timezone.is_naive(pub_date):
+            pub_date = timezone.make_aware(pub_date)
+        if author_id is None or group_id is False or not row.get('text'):
+            self._skip(number, 'нет автора, группы или текста')
+            return None
+        return Post(
+            author_id=author_id, group_id=group_id, text=row['text'],
+            image=row.get('image') or '', pub_date=pub_date,
+        )
+
+    def _skip(self, number, reason):
+        self.skipped += 1
+        if self.skipped <= MAX_REPORTED_SKIPS:
+            self.log(f'Строка {number} пропущена: {reason}')
+
+    def _posts(self, rows):
+        for number, row in enumerate(rows, start=1):
+            try:
+                post = self.build(number, row)
+            except (AttributeError, TypeError, ValueError):
+                self._skip(number, 'неверный формат')
+                continue
+            if post is not None:
+                yield post
+
+    def run(self, rows):
+        self.now = timezone.now()
+        first_id = (Post.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+        posts = self._posts(rows)
+        with explicit_pub_date(Post):
+            while True:
+                chunk = list(itertools.islice(posts, self.chunk_size))
+                if not chunk:
+                    break
+                with transaction.atomic():
+                    for start in range(0, len(chunk), self.batch_size):
+                        Post.objects.bulk_create(
+                            chunk[start:start + self.batch_size]
+                        )
+                self.progress.add(len(chunk))
+        if self.progress.rows:
+            last_id = Post.objects.aggregate(last=Max('pk'))['last']
+            recount()
+            fan_out_range(first_id, last_id)
+            bump_versions(GLOBAL_SCOPE)
+        return self.progress
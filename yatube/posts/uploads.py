@@ -0,0 +1,105 @@
+import io
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import (SkipFile,
+                                             TemporaryFileUploadHandler)
+from PIL import Image
+
+
+class LimitedTemporaryFileUploadHandler(TemporaryFileUploadHandler):
+    """Пишет загрузку на диск кусками и обрывает ее на лимите.
+
+    Как только файл превышает POSTS_IMAGE_MAX_BYTES, он закрывается, а
+    остаток части пропускается без записи на диск, и имя поля
+    запоминается в request.rejected_uploads. Тело дочитывается до конца:
+    оборванное соединение браузер показал бы как сброс, а не как форму,
+    и поля после файла потерялись бы. uploaded_files() подставляет вместо
+    файла пометку, и форма отклоняет его с ошибкой, а не молча сохраняет
+    пост без картинки.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > settings.POSTS_IMAGE_MAX_BYTES:
+            self.file.close()
+            rejected = getattr(self.request, 'rejected_uploads', {})
+            rejected[self.field_name] = (self.file_name, self.content_type)
+            self.request.rejected_uploads = rejected
+            raise SkipFile
+        self.file.write(raw_data)
+
+
+def uploaded_files(request):
+    """request.FILES с пометками вместо оборванных загрузок."""
+    rejected = getattr(request, 'rejected_uploads', None)
+    if not rejected:
+        return request.FILES
+    files = request.FILES.copy()
+    for field_name, (file_name, content_type) in rejected.items():
+        marker = UploadedFile(
+            io.BytesIO(), file_name, content_type,
+            settings.POSTS_IMAGE_MAX_BYTES + 1,
+        )
+        marker.upload_truncated = True
+        files[field_name] = marker
+    return files
+
+
+def image_header(file):
+    """(формат, ширина, высота) по заголовку файла без декодирования.
+
+    Image.open читает только начало файла, пиксели не распаковываются.
+    Если заголовок не прочитан, возвращается None.
+    """
+    position = file.tell()
+    try:
+        file.seek(0)
+        with Image.open(file) as image:
+            return image.format, image.width, image.height
+    except Image.DecompressionBombError:
+        return None, settings.POSTS_IMAGE_MAX_SIDE + 1, 1
+    except Exception:
+        return None
+    finally:
+        file.seek(position)
+
+
+def validate_image_upload(file):
+    """Отклоняем загрузку по размеру файла и заголовку картинки."""
+    if not isinstance(file, UploadedFile):
+        return
+    max_bytes = settings.POSTS_IMAGE_MAX_BYTES
+    if getattr(file, 'upload_truncated', False) or file.size > max_bytes:
+        raise ValidationError(
+            'Файл больше %(limit)s МБ.', code='too_large',
+            params={'limit': max_bytes // 2 ** 20},
+        )
+    header = image_header(file)
+    if header is None:
+        raise ValidationError(
+            'Файл не похож на картинку.', code='invalid_image'
+        )
+    image_format, width, height = header
+    if (
+        width * height > settings.POSTS_IMAGE_MAX_PIXELS
+        or max(width, height) > settings.POSTS_IMAGE_MAX_SIDE
+    ):
+        raise ValidationError(
+            'Картинка больше %(limit)s мегапикселей или %(side)s точек '
+            'по стороне.', code='too_many_pixels',
+            params={
+                'limit': settings.POSTS_IMAGE_MAX_PIXELS // 10 ** 6,
+                'side': settings.POSTS_IMAGE_MAX_SIDE,
+            },
+        )
+    if image_format not in settings.POSTS_IMAGE_FORMATS:
+        raise ValidationError(
+            'Формат %(format)s не поддерживается.', code='format',
+            params={'format': image_format},
+        )
@@ -10,6 +10,8 @@ urlpatterns = [
          name='group_list'),
     path('profile/<str:username>/', views.profile,
          name='profile'),
+    path('profile/<str:username>/export.ndjson', views.profile_export,
+         name='profile_export'),
     path('posts/<int:post_id>/', views.post_detail,
          name='post_detail'),
     path('create/', views.post_create,
@@ -18,6 +20,9 @@ urlpatterns = [
          name='post_edit'),
     path('posts/<int:post_id>/comment/', views.add_comment,
          name='add_comment'),
+    path('posts/<int:post_id>/comments/', views.post_comments,
+         name='post_comments'),
+    path('search/', views.search, name='search'),
     path('follow/', views.follow_index, name='follow_index'),
     path(
         'profile/<str:username>/follow/',
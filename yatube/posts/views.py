@@ -1,25 +1,74 @@
+import json
+import re
+from urllib.parse import quote, urlencode
+
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
-from django.views.decorators.cache import cache_page
 
+from .caching import (cache_page_versioned, comments_scopes,
+                      conditional_page, feed_count_key, follow_scopes,
+                      group_scopes, index_scopes, post_scopes, profile_scopes)
+from .counters import get_counters
 from .forms import CommentForm, PostForm
-from .models import Follow, Group, Post, User
+from .models import Comment, Follow, Group, Post, User
+from .paginators import CachedCountPaginator, CursorPaginator
+from .search import SearchPaginator, is_supported
+from .thumbnails import schedule_thumbnails
+from .timeline import backfill, follow_feed, prune
+from .transfer import export_rows, serialize
+from .uploads import uploaded_files
 
 
 DEF_POST = 10
+DEF_COMMENTS = 20
+EXPORT_CHUNK_SIZE = 2000
+
+
+def get_comments_page(post_id, after=None):
+    comments = Comment.objects.filter(post_id=post_id).select_related(
+        'author'
+    )
+    paginator = CursorPaginator(comments, DEF_COMMENTS)
+    return paginator.get_cursor_page(after=after)
+
 
+def get_search_page(request, query):
+    posts = Post.objects.select_related('author', 'group')
+    if is_supported(posts.db):
+        paginator = SearchPaginator(posts, DEF_POST, query)
+    else:
+        paginator = CursorPaginator(
+            posts.filter(text__icontains=query) if query else posts.none(),
+            DEF_POST,
+        )
+    return paginator.get_cursor_page(
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+    )
 
-def get_page(request, post_list):
-    paginator = Paginator(post_list, DEF_POST)
+
+def get_page(request, post_list, key=('pub_date', 'id'), count_key=None):
+    cursor_mode = 'after' in request.GET or 'before' in request.GET
+    if cursor_mode or settings.POSTS_CURSOR_PAGINATION:
+        paginator = CursorPaginator(post_list, DEF_POST, key=key)
+        return paginator.get_cursor_page(
+            after=request.GET.get('after'),
+            before=request.GET.get('before'),
+        )
+    paginator = CachedCountPaginator(post_list, DEF_POST, count_key=count_key)
     page_number = request.GET.get('page')
     return paginator.get_page(page_number)
 
 
-@cache_page(20, key_prefix='index_page')
+@conditional_page(index_scopes)
+@cache_page_versioned(index_scopes)
 def index(request):
     posts = Post.objects.select_related('author', 'group')
-    page_obj = get_page(request, posts)
+    page_obj = get_page(
+        request, posts, count_key=feed_count_key('index', index_scopes())
+    )
     context = {
         'page_obj': page_obj,
         'is_index': True,
@@ -27,10 +76,15 @@ def index(request):
     return render(request, 'posts/index.html', context)
 
 
+@conditional_page(group_scopes)
+@cache_page_versioned(group_scopes)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
     posts = group.posts.select_related('author')
-    page_obj = get_page(request, posts)
+    page_obj = get_page(
+        request, posts,
+        count_key=feed_count_key(f'group:{group.pk}', group_scopes(slug)),
+    )
     context = {
         'group': group,
         'page_obj': page_obj,
@@ -38,37 +92,73 @@ def group_posts(request, slug):
     return render(request, 'posts/group_list.html', context)
 
 
+@conditional_page(profile_scopes)
+@cache_page_versioned(profile_scopes)
 def profile(request, username):
     template = 'posts/profile.html'
-    author = get_object_or_404(User, username=username)
+    author = get_object_or_404(
+        User.objects.select_related('counters'), username=username
+    )
     following = False and True
     if request.user.is_authenticated:
         following = request.user.follower.filter(
             user=request.user,
             author=author).exists()
-    post_list = author.posts.all()
-    paginator = Paginator(post_list, DEF_POST)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    post_list = author.posts.select_related('group')
+    page_obj = get_page(
+        request, post_list, count_key=feed_count_key(
+            f'profile:{author.pk}', profile_scopes(username)
+        ),
+    )
     context = {
         'author': author,
+        'counters': get_counters(author),
         'page_obj': page_obj,
         'following': following
     }
     return render(request, template, context)
 
 
+def _attachment(stem, extension):
+    """Content-Disposition с ASCII-именем и именем в UTF-8 (RFC 6266).
+
+    Кириллицу в обычном filename Django кодирует как MIME-слово, и
+    браузер не разбирает заголовок.
+    """
+    fallback = re.sub(r'[^A-Za-z0-9._@+-]', '_', stem).strip('_') or 'posts'
+    filename = stem + extension
+    return (
+        f'attachment; filename="{fallback}{extension}"; '
+        f"filename*=UTF-8''{quote(filename, safe='')}"
+    )
+
+
+def profile_export(request, username):
+    author = get_object_or_404(User, username=username)
+    rows = export_rows(author.posts.all(), chunk_size=EXPORT_CHUNK_SIZE)
+    response = StreamingHttpResponse(
+        (
+            json.dumps(serialize(row), ensure_ascii=False) + '\n'
+            for row in rows
+        ),
+        content_type='application/x-ndjson; charset=utf-8',
+    )
+    response['Content-Disposition'] = _attachment(author.username, '.ndjson')
+    return response
+
+
 @login_required
 def post_create(request):
     template = 'posts/create_post.html'
     form = PostForm(
         request.POST or None,
-        files=request.FILES or None
+        files=uploaded_files(request) or None
     )
     if form.is_valid():
         temp_form = form.save(commit=False)
         temp_form.author = request.user
         temp_form.save()
+        schedule_thumbnails(temp_form.image.name)
         return redirect(
             'posts:profile', temp_form.author
         )
@@ -84,11 +174,13 @@ def post_edit(request, post_id):
         )
     form = PostForm(
         request.POST or None,
-        files=request.FILES or None,
+        files=uploaded_files(request) or None,
         instance=post
     )
     if form.is_valid():
-        form.save()
+        post = form.save()
+        if 'image' in form.changed_data:
+            schedule_thumbnails(post.image.name)
         return redirect(
             'posts:post_detail', post_id
         )
@@ -97,17 +189,34 @@ def post_edit(request, post_id):
     })
 
 
+@conditional_page(post_scopes)
+@cache_page_versioned(post_scopes)
 def post_detail(request, post_id):
     template = 'posts/post_detail.html'
-    post = get_object_or_404(Post, pk=post_id)
+    post = get_object_or_404(
+        Post.objects.select_related('author__counters', 'group'),
+        pk=post_id
+    )
     form = CommentForm()
     context = {
         'post': post,
+        'comments': get_comments_page(post.pk),
+        'counters': get_counters(post.author),
         'form': form
     }
     return render(request, template, context)
 
 
+@cache_page_versioned(comments_scopes)
+def post_comments(request, post_id):
+    post = get_object_or_404(Post.objects.only('pk'), pk=post_id)
+    context = {
+        'post': post,
+        'comments': get_comments_page(post.pk, request.GET.get('after')),
+    }
+    return render(request, 'posts/includes/comment_list.html', context)
+
+
 @login_required
 def add_comment(request, post_id):
     post = get_object_or_404(Post, id=post_id)
@@ -123,10 +232,13 @@ def add_comment(request, post_id):
 @login_required
 def follow_index(request):
     template = 'posts/follow.html'
-    posts = Post.objects.filter(author__following__user=request.user)
-    paginator = Paginator(posts, DEF_POST)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    posts, key = follow_feed(request.user)
+    page_obj = get_page(
+        request, posts, key=key, count_key=feed_count_key(
+            f'follow:{request.user.pk}',
+            [*follow_scopes(), f'viewer:{request.user.pk}'],
+        ),
+    )
     context = {
         'page_obj': page_obj,
         'is_follow_index': True,
@@ -144,11 +256,24 @@ def profile_follow(request, username):
             user=request.user,
             author=author,
         )
+        backfill(request.user, author)
     return redirect('posts:profile', username=username)
 
 
 @login_required
 def profile_unfollow(request, username):
-    get_object_or_404(request.user.follower,
-                      author__username=username).delete()
+    follow = get_object_or_404(request.user.follower,
+                               author__username=username)
+    follow.delete()
+    prune(request.user, follow.author)
     return redirect('posts:profile', username=username)
+
+
+def search(request):
+    query = request.GET.get('q', '').strip()
+    context = {
+        'query': query,
+        'page_obj': get_search_page(request, query),
+        'page_query': urlencode({'q': query}) + '&',
+    }
+    return render(request, 'posts/search.html', context)
@@ -10,11 +10,18 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
+import hashlib
 import os
+import sys
+import tempfile
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
+# Прогон тестов (manage.py test или pytest) не должен трогать кэш
+# работающего сервиса.
+TESTING = sys.argv[1:2] == ['test'] or 'pytest' in sys.modules
+
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/2.2/howto/deployment/checklist/
@@ -46,23 +53,182 @@ INSTALLED_APPS = [
     'users.apps.UsersConfig',
     'core.apps.CoreConfig',
     'about.apps.AboutConfig',
+    'benchmarks.apps.BenchmarksConfig',
     'sorl.thumbnail',
 ]
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.RequestTimingMiddleware',
+    'core.middleware.MetricsMiddleware',
+    'core.middleware.SlowQueryMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.middleware.CachedAuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
-CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+# Кэш общий для всех процессов сервиса: в нем версии страниц, из
+# которых собираются ключи и ETag, сессии и блокировки пересчета.
+# Команды вроде import_posts тоже сбрасывают страницы через него.
+# По умолчанию это файловый кэш в YATUBE_CACHE_DIR; для нескольких
+# машин YATUBE_CACHE_BACKEND и YATUBE_CACHE_LOCATION задают, например,
+# Memcached. Тесты работают с кэшем в памяти процесса.
+if TESTING:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': os.environ.get(
+                'YATUBE_CACHE_BACKEND',
+                'django.core.cache.backends.filebased.FileBasedCache',
+            ),
+            'LOCATION': os.environ.get(
+                'YATUBE_CACHE_LOCATION', os.path.join(BASE_DIR, 'cache')
+            ),
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        }
     }
+
+# Сессии по умолчанию читаются из общего кэша и пишутся в базу
+# (cached_db). С кэшем в памяти процесса выход в одном воркере не виден
+# другим, поэтому тогда сессии читаются из базы (db). Движок задает
+# YATUBE_SESSION_ENGINE, например
+# django.contrib.sessions.backends.signed_cookies.
+SESSION_ENGINE = os.environ.get(
+    'YATUBE_SESSION_ENGINE',
+    'django.contrib.sessions.backends.db'
+    if CACHES['default']['BACKEND'].endswith('.LocMemCache')
+    else 'django.contrib.sessions.backends.cached_db',
+)
+# Пользователь сессии хранится в памяти процесса AUTH_USER_CACHE_TIMEOUT
+# секунд; 0 — читать его из базы в каждом запросе.
+AUTH_USER_CACHE_TIMEOUT = int(
+    os.environ.get('YATUBE_USER_CACHE_TIMEOUT', 30)
+)
+
+# Страницы лент кэшируются надолго: при изменении постов, комментариев
+# и групп сигналы повышают версию ключей затронутых страниц. Это
+# безопасно только с общим для процессов кэшем (CACHES).
+POSTS_CACHE_TIMEOUT = 60 * 60 * 3
+# Пока один запрос пересчитывает страницу, остальные получают прошлую
+# копию; она живет на POSTS_CACHE_STALE_GRACE секунд дольше свежей.
+POSTS_CACHE_STALE_GRACE = 60
+POSTS_CACHE_LOCK_TIMEOUT = 30
+
+# Число постов ленты для пагинатора берется из кэша; после
+# POSTS_EXACT_COUNT_LIMIT постов вместо номеров страниц выводится «много».
+POSTS_COUNT_CACHE_TIMEOUT = 60 * 5
+POSTS_EXACT_COUNT_LIMIT = 10000
+
+# Курсорная пагинация лент по (pub_date, id) вместо ?page=N.
+# Переходы по ?after=/?before= работают и при выключенном флаге.
+POSTS_CURSOR_PAGINATION = False
+
+# Лента подписок: посты раскладываются по лентам подписчиков при
+# публикации, если у автора меньше TIMELINE_FANOUT_LIMIT подписчиков.
+TIMELINE_FANOUT_LIMIT = 1000
+TIMELINE_BATCH_SIZE = 500
+
+# Миниатюры постов создаются фоновым пулом из POSTS_THUMBNAIL_WORKERS
+# потоков; 0 — создавать синхронно в запросе.
+THUMBNAIL_BACKEND = 'posts.thumbnails.AsyncThumbnailBackend'
+POSTS_THUMBNAIL_WORKERS = 2
+
+# Загрузки всегда пишутся во временный файл кусками, а файл больше
+# POSTS_IMAGE_MAX_BYTES не сохраняется. Картинка проверяется по
+# заголовку, до декодирования: допустимы форматы POSTS_IMAGE_FORMATS
+# не больше POSTS_IMAGE_MAX_PIXELS точек и POSTS_IMAGE_MAX_SIDE по стороне.
+FILE_UPLOAD_HANDLERS = ['posts.uploads.LimitedTemporaryFileUploadHandler']
+POSTS_IMAGE_MAX_BYTES = 10 * 1024 * 1024
+POSTS_IMAGE_MAX_PIXELS = 40_000_000
+POSTS_IMAGE_MAX_SIDE = 10000
+POSTS_IMAGE_FORMATS = ('JPEG', 'PNG', 'GIF', 'WEBP')
+
+# Картинка хранится одним файлом на все посты с ней и удаляется вместе
+# с последним. Файл, записанный или переиспользованный загрузкой за
+# последние POSTS_IMAGE_RELEASE_GRACE секунд, не удаляется: пост с ним
+# может быть еще не сохранен.
+POSTS_IMAGE_RELEASE_GRACE = 60
+
+# Замеры запросов: заголовок Server-Timing и JSON-строка в логе
+# yatube.timing (файл REQUEST_TIMING_LOG). Включаются переменной
+# окружения YATUBE_REQUEST_TIMING, по умолчанию — при DEBUG вне тестов;
+# выключенная прослойка не подключается.
+REQUEST_TIMING = os.environ.get(
+    'YATUBE_REQUEST_TIMING', str(DEBUG and not TESTING)
+).lower() in ('1', 'true', 'yes', 'on')
+REQUEST_TIMING_LOG = os.environ.get(
+    'YATUBE_TIMING_LOG',
+    os.devnull if TESTING else os.path.join(BASE_DIR, 'logs', 'timing.log'),
+)
+
+# Метрики для /metrics. Каждый воркер пишет значения в свой файл
+# в METRICS_DIR, а /metrics складывает файлы всех воркеров; файлы
+# завершившихся процессов удаляет следующий запустившийся. Каталог
+# по умолчанию свой у каждой установки; в тестах метрики выключены.
+METRICS_ENABLED = os.environ.get(
+    'YATUBE_METRICS', str(not TESTING)
+).lower() in ('1', 'true', 'yes', 'on')
+METRICS_DIR = os.environ.get(
+    'YATUBE_METRICS_DIR',
+    os.path.join(
+        tempfile.gettempdir(),
+        'yatube-metrics-' + hashlib.md5(BASE_DIR.encode()).hexdigest()[:8],
+    ),
+)
+
+# Запросы к базе default дольше SLOW_QUERY_THRESHOLD_MS пишутся в
+# SLOW_QUERY_LOG вместе с представлением и строкой кода, для первого
+# появления запроса — с EXPLAIN QUERY PLAN. Сводка — /admin/slow-queries/.
+# Пустая YATUBE_SLOW_QUERY_MS выключает лог.
+SLOW_QUERY_THRESHOLD_MS = os.environ.get('YATUBE_SLOW_QUERY_MS', '100')
+SLOW_QUERY_THRESHOLD_MS = (
+    float(SLOW_QUERY_THRESHOLD_MS) if SLOW_QUERY_THRESHOLD_MS else None
+)
+SLOW_QUERY_LOG = os.environ.get(
+    'YATUBE_SLOW_QUERY_LOG', os.path.join(BASE_DIR, 'logs', 'slow_queries.log')
+)
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'timing': {
+            'class': 'core.slow_queries.RotatingLogHandler',
+            'filename': REQUEST_TIMING_LOG,
+            'maxBytes': 5 * 1024 * 1024,
+            'backupCount': 3,
+            'encoding': 'utf-8',
+            'delay': True,
+        },
+        'slow_queries': {
+            'class': 'core.slow_queries.RotatingLogHandler',
+            'filename': SLOW_QUERY_LOG,
+            'maxBytes': 5 * 1024 * 1024,
+            'backupCount': 3,
+            'encoding': 'utf-8',
+            'delay': True,
+        },
+    },
+    'loggers': {
+        'yatube.timing': {
+            'handlers': ['timing'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+        'yatube.slow_queries': {
+            'handlers': ['slow_queries'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
 }
 
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
@@ -83,7 +249,7 @@ STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.timing.TimedDjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -149,3 +315,17 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/2.2/howto/static-files/
 
 STATIC_URL = '/static/'
+
+# collectstatic собирает статику в STATIC_ROOT с хэшем содержимого в
+# именах файлов (манифест staticfiles.json) и сжатыми копиями .gz/.br.
+# При YATUBE_STATIC_SERVE приложение само отдает их по STATIC_URL:
+# сжатую копию по Accept-Encoding, файлы с хэшем — с Cache-Control
+# immutable на год, остальные — на STATIC_MAX_AGE секунд.
+STATIC_ROOT = os.environ.get(
+    'YATUBE_STATIC_ROOT', os.path.join(BASE_DIR, 'collected_static')
+)
+STATICFILES_STORAGE = 'core.staticfiles.CompressedManifestStaticFilesStorage'
+STATIC_SERVE = os.environ.get(
+    'YATUBE_STATIC_SERVE', 'true'
+).lower() in ('1', 'true', 'yes', 'on')
+STATIC_MAX_AGE = 60
@@ -13,10 +13,14 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+import re
+
+from core.staticfiles import serve as serve_static
+from core.views import metrics, slow_queries
 from django.conf import settings
 from django.conf.urls.static import static
 from django.contrib import admin
-from django.urls import include, path
+from django.urls import include, path, re_path
 
 
 handler404 = 'core.views.page_not_found'
@@ -24,14 +28,30 @@ handler403 = 'core.views.csrf_failure'
 
 
 urlpatterns = [
+    path(
+        'admin/slow-queries/',
+        admin.site.admin_view(slow_queries),
+        name='slow_queries',
+    ),
     path('admin/', admin.site.urls),
     path('', include('posts.urls', namespace='posts')),
+    path('api/v1/', include('posts.api_urls', namespace='api')),
     path('auth/', include('users.urls')),
     path('auth/', include('django.contrib.auth.urls')),
     path('about/', include('about.urls', namespace='about')),
+    path('metrics', metrics, name='metrics'),
 ]
 
 if settings.DEBUG:
     urlpatterns += static(
         settings.MEDIA_URL, document_root=settings.MEDIA_ROOT
     )
+
+if settings.STATIC_SERVE:
+    urlpatterns += [
+        re_path(
+            r'^%s(?P<path>.+)$' % re.escape(settings.STATIC_URL.lstrip('/')),
+            serve_static,
+            name='static',
+        ),
+    ]